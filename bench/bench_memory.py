@@ -0,0 +1,96 @@
+# bench/bench_memory.py
+# 自習狀態與學習紀錄的記憶體 / 檔案大小量測：舊格式（dict + datetime / ISO）對照 slotted 型別 + epoch
+#   python -m bench.bench_memory --sizes 10000 100000 1000000
+import os
+import sys
+import json
+import argparse
+import subprocess
+from datetime import datetime, timedelta
+from utils.records import LogRecord, Session
+
+BASE = 1_790_000_000   # 固定起點，結果可重現
+
+# ========= 建立資料 =========
+def legacy_record(i: int) -> dict:
+    start = datetime.fromtimestamp(BASE + i * 60)
+    return {
+        "guild_id": 1000 + i % 7, "user_id": 10_000 + i % 5000, "username": f"user{i % 5000}",
+        "object": "數學", "start": start.isoformat(), "end": (start + timedelta(minutes=30)).isoformat(),
+        "minutes": 30,
+    }
+
+def compact_record(i: int) -> LogRecord:
+    start = BASE + i * 60
+    return LogRecord(1000 + i % 7, 10_000 + i % 5000, f"user{i % 5000}", "數學", start, start + 1800, 30)
+
+def legacy_session(i: int) -> dict:
+    start = datetime.fromtimestamp(BASE + i * 60)
+    return {"start": start, "end": start + timedelta(minutes=30), "object": "數學",
+            "notify_channel_id": 2000 + i % 7, "room": 3000 + i % 7}
+
+def compact_session(i: int) -> Session:
+    start = BASE + i * 60
+    return Session(start, start + 1800, "數學", 2000 + i % 7, 3000 + i % 7)
+
+KINDS = {
+    "record:dict+iso": legacy_record,
+    "record:LogRecord": compact_record,
+    "session:dict+datetime": legacy_session,
+    "session:Session": compact_session,
+}
+
+# ========= 量測 =========
+def rss() -> int:
+    # Linux：/proc/self/statm 第二欄為常駐頁數
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+def measure(kind: str, n: int) -> tuple:
+    """在獨立子行程中執行，避免前一輪釋放的記憶體干擾"""
+    build = KINDS[kind]
+    before = rss()
+    # sessions 依 user_id 放在 dict 中，紀錄則是 list（例如寫入佇列、統計重建）
+    data = {i: build(i) for i in range(n)} if kind.startswith("session") else [build(i) for i in range(n)]
+    after = rss()
+    return after, (after - before) / n, len(data)
+
+def disk_sizes(n: int) -> tuple:
+    """舊版 indent=2 的 JSON 陣列 vs 精簡 JSON Lines，回傳每筆位元組數"""
+    legacy = compact = 0
+    for i in range(n):
+        legacy += len(json.dumps(legacy_record(i), ensure_ascii=False, indent=2).encode()) + 4   # 陣列的縮排與逗號
+        compact += len(json.dumps(compact_record(i).to_row(), ensure_ascii=False, separators=(",", ":")).encode()) + 1
+    return legacy / n, compact / n
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="自習狀態 / 學習紀錄記憶體量測")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--case", nargs=2, metavar=("KIND", "N"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.case:
+        after, per, _ = measure(args.case[0], int(args.case[1]))
+        print(f"{after} {per}")
+        return 0
+
+    print(f"{'kind':<24}{'n':>10}{'RSS MB':>10}{'B/item':>10}")
+    for n in args.sizes:
+        for kind in KINDS:
+            out = subprocess.run(
+                [sys.executable, "-m", "bench.bench_memory", "--case", kind, str(n)],
+                capture_output=True, text=True, check=True,
+            ).stdout.split()
+            after, per = int(out[0]), float(out[1])
+            print(f"{kind:<24}{n:>10}{after / 1024 / 1024:>10.1f}{per:>10.1f}")
+    # 每筆大小與總數無關，取樣估算後乘上筆數
+    legacy, compact = disk_sizes(min(max(args.sizes), 100_000))
+    print()
+    print(f"{'disk':<24}{'n':>10}{'legacy MB':>12}{'jsonl MB':>12}")
+    for n in args.sizes:
+        print(f"{'learning log':<24}{n:>10}{legacy * n / 1024 / 1024:>12.1f}{compact * n / 1024 / 1024:>12.1f}")
+    print(f"per record: legacy {legacy:.1f} B, jsonl {compact:.1f} B")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# bench/bench_study.py
+# Study cog 離線壓測：不需要 token 與網路
+#   python -m bench.bench_study --users 1000 --guilds 1 --fetch-latency 50
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+from collections import defaultdict
+from bench.fakes import FakeBot, FakeUser, FakeGuild, FakeChannel, FakeVoiceChannel, FakeVoiceState, FakeInteraction
+
+# ========= 量測 =========
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)   # 名稱 -> 秒數
+
+    async def timed(self, name: str, coro):
+        t0 = time.perf_counter()
+        await coro
+        self.samples[name].append(time.perf_counter() - t0)
+
+    def report(self) -> str:
+        lines = [f"{'operation':<24}{'count':>8}{'ops/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"]
+        for name, xs in self.samples.items():
+            xs = sorted(xs)
+            total = sum(xs)
+            p50 = xs[len(xs) // 2]
+            p99 = xs[min(len(xs) - 1, int(len(xs) * 0.99))]
+            lines.append(
+                f"{name:<24}{len(xs):>8}{len(xs) / total if total else 0:>12.0f}"
+                f"{p50 * 1000:>10.3f}{p99 * 1000:>10.3f}{xs[-1] * 1000:>10.3f}"
+            )
+        return "\n".join(lines)
+
+def file_size(path: str) -> int:
+    if os.path.isdir(path):
+        # segmented：目錄下所有段與索引
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    # sqlite WAL 模式下新資料先落在 -wal 檔
+    return sum(os.path.getsize(p) for p in (path, path + "-wal") if os.path.exists(p))
+
+# ========= 情境 =========
+async def run(args):
+    # cogs.study 在 import 時讀取路徑設定，先切到暫存目錄
+    workdir = tempfile.mkdtemp(prefix="studymate-bench-")
+    os.environ["LOG_BACKEND"] = args.backend
+    os.environ["LOG_PATH"] = os.path.join(workdir, {"sqlite": "learning_log.db", "jsonl": "learning_log.jsonl"}.get(args.backend, "learning_log"))
+    os.environ["JOURNAL_PATH"] = os.path.join(workdir, "session_journal.jsonl")
+    os.chdir(workdir)
+    from cogs import study
+
+    bot = FakeBot(fetch_latency=args.fetch_latency / 1000, cache_hit=not args.cache_miss)
+    cog = study.Study(bot)
+    await cog.cog_load()
+
+    rec = Recorder()
+    guilds = [FakeGuild(1000 + g) for g in range(args.guilds)]
+    text = {g.id: FakeChannel(2000 + g.id, g) for g in guilds}
+    voice = {g.id: FakeVoiceChannel(3000 + g.id, g) for g in guilds}
+    for ch in text.values():
+        bot.add_channel(ch)
+
+    members = []
+    for i in range(args.users):
+        g = guilds[i % len(guilds)]
+        m = FakeUser(10_000 + i)
+        m.guild = g
+        m.voice = FakeVoiceState(voice[g.id])
+        bot.add_user(m)
+        members.append(m)
+
+    def inter(m):
+        return FakeInteraction(m, text[m.guild.id])
+
+    size_before = file_size(study.LOG_PATH)
+    t_start = time.perf_counter()
+
+    # 1. 全員加入
+    for m in members:
+        await rec.timed("start_learning", cog.start_learning.callback(cog, inter(m), args.duration, "bench"))
+    # 2. 一半延長
+    for m in members[::2]:
+        await rec.timed("add_learning_time", cog.add_learning_time.callback(cog, inter(m), 10))
+    # 3. 教室坐滿時量 render_seat_map：第一次需要查使用者（--cache-miss 時走 fetch_user），之後命中快取
+    room = study.get_room(study.get_state(guilds[0].id), voice[guilds[0].id].id)
+    for _ in range(200):
+        room.version += 1   # 強制重繪
+        await rec.timed("render_seat_map", study.render_seat_map(bot, room))
+    # 4. 座位表
+    for m in members[: min(len(members), 200)]:
+        await rec.timed("show_seatmap", cog.show_seatmap.callback(cog, inter(m)))
+    # 5. 一半手動結束
+    split = len(members) // 2
+    for m in members[:split]:
+        await rec.timed("finish_learning", cog.finish_learning.callback(cog, inter(m)))
+    # 6. 剩下的人同時斷線
+    leave = []
+    for m in members[split:]:
+        before, after = FakeVoiceState(voice[m.guild.id]), FakeVoiceState(None)
+        m.voice = after
+        leave.append(rec.timed("on_voice_state_update", cog.on_voice_state_update(m, before, after)))
+    t_burst = time.perf_counter()
+    await asyncio.gather(*leave)
+    burst = time.perf_counter() - t_burst
+
+    # 7. 直接量 save_log
+    for i in range(args.users):
+        now = study.now_epoch()
+        await rec.timed("save_log", _call(study.save_log, guilds[0].id, i, "bench", "bench", now, now, 1))
+
+    # 回覆後才執行的寫紀錄 / followup 也算進來
+    await study.side_effects.drain()
+    await asyncio.to_thread(study.log_store.flush)
+    elapsed = time.perf_counter() - t_start
+    # 等座位表看板把合併後的變動送出
+    await asyncio.sleep(study.seat_board.window + study.seat_board.min_interval + 0.1)
+    size_after = file_size(study.LOG_PATH)
+    await cog.cog_unload()
+
+    total_ops = sum(len(v) for v in rec.samples.values())
+    print(rec.report())
+    print()
+    print(f"users={args.users} guilds={args.guilds} backend={args.backend} workdir={workdir}")
+    print(f"total {total_ops} ops in {elapsed:.2f}s ({total_ops / elapsed:.0f} ops/s)")
+    print(f"voice-leave burst of {len(leave)}: {burst * 1000:.1f} ms")
+    print(f"log file growth: {size_after - size_before} bytes ({(size_after - size_before) / max(1, args.users * 2):.1f} B/record)")
+    print(
+        f"fetch_user calls: {bot.fetches}, messages sent: {sum(ch.sent for ch in text.values())}, "
+        f"seat board edits: {sum(ch.edits for ch in text.values())}"
+    )
+
+async def _call(fn, *args):
+    fn(*args)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Study cog 離線壓測")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--guilds", type=int, default=1)
+    parser.add_argument("--duration", type=int, default=60, help="每個自習的分鐘數")
+    parser.add_argument("--backend", choices=("segmented", "jsonl", "sqlite"), default="segmented")
+    parser.add_argument("--fetch-latency", type=float, default=0.0, help="模擬 fetch_user 延遲（毫秒）")
+    parser.add_argument("--cache-miss", action="store_true", help="get_user 一律落空，強制走 fetch_user")
+    args = parser.parse_args(argv)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    sys.exit(main())
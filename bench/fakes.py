@@ -0,0 +1,119 @@
+# bench/fakes.py
+# 離線壓測用的 Discord 替身：只實作 Study cog 用得到的屬性與方法
+import asyncio
+from typing import Optional
+
+class FakeUser:
+    def __init__(self, user_id: int, name: str = None):
+        self.id = user_id
+        self.name = name or f"user{user_id}"
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+        self.voice: Optional["FakeVoiceState"] = None
+        self.guild: Optional["FakeGuild"] = None
+        self.dms = 0
+
+    async def send(self, *args, **kwargs):
+        self.dms += 1
+
+    def __str__(self):
+        return self.name
+
+class FakeGuild:
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+
+class FakeVoiceChannel:
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+
+class FakeVoiceState:
+    def __init__(self, channel: Optional[FakeVoiceChannel]):
+        self.channel = channel
+
+class FakeMessage:
+    def __init__(self, channel: "FakeChannel", content: str):
+        self.id = id(self)
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, content: str = None, **kwargs):
+        self.channel.edits += 1
+        if content is not None:
+            self.content = content
+
+class FakeChannel:
+    def __init__(self, channel_id: int, guild: FakeGuild):
+        self.id = channel_id
+        self.guild = guild
+        self.sent = 0
+        self.edits = 0
+
+    async def send(self, content: str = None, **kwargs):
+        self.sent += 1
+        return FakeMessage(self, content)
+
+class FakeResponse:
+    def __init__(self):
+        self._done = False
+        self.messages = []
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def send_message(self, content: str = None, **kwargs):
+        self._done = True
+        self.messages.append(content)
+
+    async def defer(self, **kwargs):
+        self._done = True
+
+    async def edit_message(self, **kwargs):
+        self._done = True
+
+class FakeFollowup:
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, content: str = None, **kwargs):
+        self.messages.append(content)
+
+class FakeInteraction:
+    def __init__(self, user: FakeUser, channel: FakeChannel):
+        self.user = user
+        self.channel = channel
+        self.guild_id = channel.guild.id
+        self.response = FakeResponse()
+        self.followup = FakeFollowup()
+
+class FakeBot:
+    """get_user 命中率與 fetch_user 延遲可調，用來模擬 REST 往返"""
+
+    def __init__(self, fetch_latency: float = 0.0, cache_hit: bool = True):
+        self.fetch_latency = fetch_latency
+        self.cache_hit = cache_hit
+        self.users = {}
+        self.channels = {}
+        self.guilds = []   # 基準測試不連語音，卸載時不用斷線
+        self.fetches = 0
+        self.owner_id = 0
+        self.loop = None
+
+    def add_user(self, user: FakeUser):
+        self.users[user.id] = user
+
+    def add_channel(self, channel: FakeChannel):
+        self.channels[channel.id] = channel
+
+    def get_user(self, user_id: int):
+        return self.users.get(user_id) if self.cache_hit else None
+
+    async def fetch_user(self, user_id: int):
+        self.fetches += 1
+        if self.fetch_latency:
+            await asyncio.sleep(self.fetch_latency)
+        return self.users.get(user_id)
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
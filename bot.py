@@ -1,45 +1,126 @@
 import discord
+from discord import app_commands
 from discord.ext import commands
 from dotenv import load_dotenv
 import asyncio
+import time
 import os
+BOOT = time.perf_counter()   # 行程啟動時間，啟動報告以此為起點
+from utils.sharding import shard_config
+from utils.metrics import metrics
+from utils.command_sync import tree_fingerprint, load_fingerprint, save_fingerprint
+from utils.startup import StartupProfile, discover_extensions, load_extensions, load_waves, prewarm_imports
 
 # ========= 載入 .env =========
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 GUILD_ID_ENV = os.getenv("GUILD_ID", "").strip()
 GUILD_ID = int(GUILD_ID_ENV) if GUILD_ID_ENV.isdigit() else None
-guild = discord.Object(id=GUILD_ID)
+guild = discord.Object(id=GUILD_ID) if GUILD_ID else None   # 有設定時只同步到該伺服器（開發用）
+SHARD_IDS, SHARD_COUNT = shard_config()
+SYNC_FORCE = os.getenv("SYNC_FORCE", "").strip() == "1"   # 忽略指紋，啟動時強制同步
+METRICS_FILE = os.getenv("METRICS_FILE", "").strip()   # 設定後定期輸出 Prometheus 文字檔
+METRICS_INTERVAL = float(os.getenv("METRICS_INTERVAL", "15"))
+STARTUP_PROFILE = os.getenv("STARTUP_PROFILE", "").strip() == "1"   # on_ready 後印出各階段耗時
+
+# ========= 指令計時 =========
+class InstrumentedTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # 記下開始時間，完成 / 失敗時計算延遲
+        interaction.extras["started"] = time.perf_counter()
+        return True
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        name = interaction.command.qualified_name if interaction.command else "unknown"
+        metrics.error("app_command", name)
+        started = interaction.extras.get("started")
+        if started is not None:
+            metrics.observe("app_command", time.perf_counter() - started, name)
+        await super().on_error(interaction, error)
 
 # ========= 定義 MyBot =========
-class MyBot(commands.Bot):
+class MyBot(commands.AutoShardedBot):
     def __init__(self):
         intents = discord.Intents.default()
         intents.voice_states = True         # 允許追蹤語音頻道事件
         intents.messages = True              
         intents.message_content = True      # 允許讀取訊息內容
-        super().__init__(command_prefix="!coo ", intents=intents)
+        # 多行程部署時以 SHARD_IDS / SHARD_COUNT 指定這個行程負責的分片
+        super().__init__(
+            command_prefix="!coo ", intents=intents, shard_ids=SHARD_IDS, shard_count=SHARD_COUNT,
+            tree_cls=InstrumentedTree,
+        )
+        self._metric_tasks = []
+        self.profile = StartupProfile(BOOT)
+        self._startup_task = None
+        self._setup_done = None
+
+    def _schedule_event(self, coro, event_name, *args, **kwargs):
+        # 所有 listener 都經過這裡，包一層計時與錯誤計數
+        return super()._schedule_event(metrics.wrap_listener(coro, event_name), event_name, *args, **kwargs)
             
     async def setup_hook(self):
-        # 載入 Cogs
-        for filename in os.listdir("./cogs"):
-            if filename.endswith(".py") and not filename.startswith("_"):
-                ext = f"cogs.{filename[:-3]}"
-                try:
-                    await self.load_extension(ext)
-                    print(f"✅ 已載入 {ext}")
-                except Exception as e:
-                    print(f"❌ 載入 {ext} 失敗: {e}")
-
-        # 把全域指令複製到指定伺服器
-        self.tree.copy_global_to(guild=guild)
-        
-        # 同步 slash 指令到伺服器
+        self._metric_tasks.append(asyncio.create_task(metrics.sample_loop_lag()))
+        if METRICS_FILE:
+            self._metric_tasks.append(asyncio.create_task(metrics.export_loop(METRICS_FILE, METRICS_INTERVAL)))
+
+        # 解析 cogs 的 DEPENDS / LAZY，先在執行緒預先 import，再逐層並行載入
+        with self.profile.phase("discover + import"):
+            infos = discover_extensions("cogs")
+            await prewarm_imports(list(infos.values()))
+        eager = [n for n, info in infos.items() if not info.lazy]
+        with self.profile.phase("extensions"):
+            await load_extensions(self, infos, eager, self.profile)
+
+        # LAZY 的 cog 與指令同步不擋登入，放到背景完成
+        self._setup_done = time.perf_counter()
+        self._startup_task = asyncio.create_task(self.finish_startup(infos, [n for n in infos if n not in eager]))
+
+    async def finish_startup(self, infos, lazy):
+        if lazy:
+            with self.profile.phase("lazy extensions"):
+                await load_extensions(self, infos, lazy, self.profile)
+            self.dispatch("extensions_changed")
+        with self.profile.phase("sync"):
+            synced = await self.sync_commands(force=SYNC_FORCE)
+        print(f"🔧 {sync_summary(synced)}")
+
+    async def sync_commands(self, force: bool = False):
+        """指令樹沒有變動時略過同步並回傳 None；force=True 時一律同步"""
+        if guild:
+            # 把全域指令複製到指定伺服器
+            self.tree.copy_global_to(guild=guild)
+            scope = f"guild:{GUILD_ID}"
+        elif self.shard_ids is None or 0 in self.shard_ids:
+            scope = "global"
+        else:
+            # 全域同步只需要一個行程做（負責分片 0 的那個）
+            return None
+
+        digest = tree_fingerprint(self.tree, guild)
+        if not force and load_fingerprint(scope) == digest:
+            return None
+        # 同步 slash 指令
         synced = await self.tree.sync(guild=guild)
-        print(f"🔧 {len(synced)} slash commands synced to guild {GUILD_ID}")
+        save_fingerprint(scope, digest)
+        return synced
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        started = interaction.extras.get("started")
+        if started is not None:
+            metrics.observe("app_command", time.perf_counter() - started, command.qualified_name)
 
     async def on_ready(self):
         print(f"✅ 已登入：{self.user} (ID: {self.user.id})")
+        if self._setup_done is None:
+            return
+        # 只在第一次 on_ready 回報（重新連線也會觸發）
+        self.profile.mark("login + ready", self._setup_done)
+        self._setup_done = None
+        if self._startup_task:
+            await self._startup_task
+        if STARTUP_PROFILE:
+            print(f"⏱️ 啟動耗時：\n{self.profile.render()}")
 
     async def on_message(self, message: discord.Message):
         # 避免機器人自己觸發
@@ -51,6 +132,11 @@ class MyBot(commands.Bot):
 bot = MyBot()
 bot.remove_command("help")
 
+def sync_summary(synced) -> str:
+    if synced is None:
+        return "slash commands unchanged, sync skipped."
+    return f"{len(synced)} slash commands synced to {f'guild {GUILD_ID}' if guild else 'global'}."
+
 # ========= 管理指令 =========
 @bot.command(name="reload_cog")
 @commands.is_owner()
@@ -65,34 +151,41 @@ async def reload_cog(ctx, cog: str):
     except Exception as e:
         await ctx.send(f"❌ `{ext}` 重新載入失敗：`{e}`")
     
-    # 把全域指令複製到指定伺服器
-    bot.tree.copy_global_to(guild=guild)
-    
-    # 同步斜線指令到伺服器
-    synced = await bot.tree.sync(guild=guild)
-    await ctx.send(f"🔄️ {len(synced)} slash commands synced to guild.")
+    # 通知 Help 等快取重建
+    bot.dispatch("extensions_changed")
+
+    # 同步斜線指令（指令樹沒變就略過）
+    synced = await bot.sync_commands()
+    await ctx.send(f"🔄️ {sync_summary(synced)}")
 
 @bot.command(name="reload_all")
 @commands.is_owner()
 async def reload_all(ctx):
     """重新載入所有 Cogs"""
-    for filename in os.listdir("./cogs"):
-        if filename.endswith(".py") and not filename.startswith("_"):
-            ext = f"cogs.{filename[:-3]}"
-            try:
-                if ext in bot.extensions:
-                    await bot.unload_extension(ext)
-                await bot.load_extension(ext)
-                await ctx.send(f"🔄️ `{ext}` 重新載入成功！")
-            except Exception as e:
-                await ctx.send(f"❌ `{ext}` 重新載入失敗：`{e}`")
+    infos = discover_extensions("cogs")
+    # 依 DEPENDS 順序重新載入，被依賴的先載入
+    for ext in (n for wave in load_waves(infos, list(infos)) for n in wave):
+        try:
+            if ext in bot.extensions:
+                await bot.unload_extension(ext)
+            await bot.load_extension(ext)
+            await ctx.send(f"🔄️ `{ext}` 重新載入成功！")
+        except Exception as e:
+            await ctx.send(f"❌ `{ext}` 重新載入失敗：`{e}`")
     
-    # 把全域指令複製到指定伺服器
-    bot.tree.copy_global_to(guild=guild)
-    
-    # 同步斜線指令到伺服器
-    synced = await bot.tree.sync(guild=guild)
-    await ctx.send(f"🔄️ {len(synced)} slash commands synced to guild.")
+    # 通知 Help 等快取重建
+    bot.dispatch("extensions_changed")
+
+    # 同步斜線指令（指令樹沒變就略過）
+    synced = await bot.sync_commands()
+    await ctx.send(f"🔄️ {sync_summary(synced)}")
+
+@bot.command(name="sync")
+@commands.is_owner()
+async def sync(ctx, force: str = ""):
+    """同步斜線指令，加上 force 則忽略指紋強制同步"""
+    synced = await bot.sync_commands(force=force == "force")
+    await ctx.send(f"🔄️ {sync_summary(synced)}")
 
 @bot.command(name="list_cogs")
 async def list_cogs(ctx):
@@ -103,6 +196,12 @@ async def list_cogs(ctx):
     else:
         await ctx.send("⚠️ 目前沒有載入任何 Cogs")
 
+@bot.command(name="metrics")
+@commands.is_owner()
+async def show_metrics(ctx):
+    """顯示指令延遲、事件迴圈延遲與寫檔時間"""
+    await ctx.send(f"📈 執行狀態：\n```\n{metrics.render_text()[:1900]}\n```")
+
 # ========= 啟動 =========
 if __name__ == "__main__":
     async def main():
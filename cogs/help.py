@@ -3,7 +3,10 @@ import discord
 from discord.ext import commands
 from discord import app_commands
 import inspect
-from typing import Optional, Union, get_origin, get_args
+import itertools
+from typing import Iterable, Optional, Union, get_origin, get_args
+
+LAZY = True   # 登入後才在背景載入，不拖慢啟動；目錄在載入時就建好
 
 # 處理參數格式
 def format_param(name: str, param: inspect.Parameter) -> str:
@@ -52,58 +55,147 @@ def build_command_description(cmd: app_commands.Command) -> str:
         f"　範例：{example}"
     )
 
+PAGE_CHARS = 3500       # embed description 上限 4096，留一點餘裕
+PAGE_COMMANDS = 10
+MAX_OPTIONS = 25        # discord.ui.Select 選項上限
+
+# 指令目錄：分類、說明文字與分頁 embed 只在載入後建立一次
+class HelpCatalogue:
+    def __init__(self, bot: commands.Bot, pending: Iterable = ()):
+        # pending：cog_load 時自己的指令還沒加進指令樹，由呼叫端另外帶入
+        grouped = {}
+        self.descriptions = {}   # qualified_name -> 說明文字
+        for cmd in itertools.chain(bot.tree.walk_commands(), pending):
+            if not isinstance(cmd, app_commands.Command) or cmd.qualified_name in self.descriptions:
+                continue
+            cog_name = cmd.binding.__cog_name__ if cmd.binding else "未分類"
+            grouped.setdefault(cog_name, []).append(cmd)
+            self.descriptions[cmd.qualified_name] = build_command_description(cmd)
+
+        self.pages = {}   # 分類 -> [embed, ...]
+        for cog, cmds in grouped.items():
+            chunks, current, size = [], [], 0
+            for cmd in cmds:
+                text = self.descriptions[cmd.qualified_name]
+                if current and (size + len(text) > PAGE_CHARS or len(current) >= PAGE_COMMANDS):
+                    chunks.append(current)
+                    current, size = [], 0
+                current.append(text)
+                size += len(text) + 2
+            if current:
+                chunks.append(current)
+            self.pages[cog] = [
+                discord.Embed(
+                    title=f"📂 {cog} 指令",
+                    description="\n\n".join(chunk),
+                    color=discord.Color.blurple()
+                ).set_footer(text=f"第 {i}/{len(chunks)} 頁")
+                for i, chunk in enumerate(chunks, 1)
+            ]
+        self.counts = {cog: len(cmds) for cog, cmds in grouped.items()}
+
+        self.overview = discord.Embed(
+            title="📖 指令總覽",
+            description="請從下拉選單中選擇一個分類，或使用 `/help <指令>` 搜尋",
+            color=discord.Color.green()
+        )
+
+    def command_embed(self, name: str) -> Optional[discord.Embed]:
+        text = self.descriptions.get(name)
+        if text is None:
+            return None
+        return discord.Embed(title="🔎 指令說明", description=text, color=discord.Color.blurple())
+
+    def search(self, query: str) -> list:
+        query = query.lower().lstrip("/")
+        return [name for name in self.descriptions if query in name.lower()][:MAX_OPTIONS]
+
 # 下拉選單
 class HelpSelect(discord.ui.Select):
-    def __init__(self, grouped):
+    def __init__(self, catalogue: HelpCatalogue):
         options = [
-            discord.SelectOption(label=cog, description=f"{len(cmds)} 個指令")
-            for cog, cmds in grouped.items()
+            discord.SelectOption(label=cog, description=f"{count} 個指令")
+            for cog, count in list(catalogue.counts.items())[:MAX_OPTIONS]
         ]
-        super().__init__(placeholder="選擇要查看的分類…", options=options)
-        self.grouped = grouped
+        super().__init__(placeholder="選擇要查看的分類…", options=options, row=0)
 
     async def callback(self, interaction: discord.Interaction):
-        cog = self.values[0]
-        embed = discord.Embed(
-            title=f"📂 {cog} 指令",
-            color=discord.Color.blurple()
-        )
-        value_lines = []
-        for cmd in self.grouped[cog]:
-            value_lines.append(build_command_description(cmd))
-        embed.description = "\n\n".join(value_lines)
-        await interaction.response.edit_message(embed=embed, view=self.view)
+        self.view.category = self.values[0]
+        self.view.page = 0
+        await self.view.show(interaction)
 
 class HelpView(discord.ui.View):
-    def __init__(self, grouped, timeout=120):
+    def __init__(self, catalogue: HelpCatalogue, timeout=120):
         super().__init__(timeout=timeout)
-        self.add_item(HelpSelect(grouped))
+        self.catalogue = catalogue
+        self.category = None
+        self.page = 0
+        self.add_item(HelpSelect(catalogue))
+        self.update_buttons()
+
+    def update_buttons(self):
+        total = len(self.catalogue.pages.get(self.category, [])) if self.category else 0
+        self.prev_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= total - 1
+
+    async def show(self, interaction: discord.Interaction):
+        self.update_buttons()
+        embed = self.catalogue.pages[self.category][self.page]
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀", style=discord.ButtonStyle.secondary, row=1)
+    async def prev_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page -= 1
+        await self.show(interaction)
+
+    @discord.ui.button(label="▶", style=discord.ButtonStyle.secondary, row=1)
+    async def next_page(self, interaction: discord.Interaction, button: discord.ui.Button):
+        self.page += 1
+        await self.show(interaction)
 
 # Cog
 class Help(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self._catalogue: Optional[HelpCatalogue] = None
+
+    async def cog_load(self):
+        # 載入時就建好目錄，第一個 /help 不用等走訪與排版
+        self._catalogue = HelpCatalogue(self.bot, self.walk_app_commands())
+
+    @property
+    def catalogue(self) -> HelpCatalogue:
+        if self._catalogue is None:
+            self._catalogue = HelpCatalogue(self.bot)
+        return self._catalogue
+
+    # bot.py 在載入 / 重新載入 Cogs 後發出，立即重建目錄
+    @commands.Cog.listener()
+    async def on_extensions_changed(self):
+        self._catalogue = HelpCatalogue(self.bot)
 
     @app_commands.command(
         name="help", 
         description="查看所有可用的斜線指令",
-        extras={"example": "/help"}
+        extras={"example": "/help [command]start_learning"}
     )
-    async def help_command(self, interaction: discord.Interaction):
-        # 分類
-        grouped = {}
-        for cmd in self.bot.tree.walk_commands():
-            if not isinstance(cmd, app_commands.Command):
-                continue
-            cog_name = cmd.binding.__cog_name__ if hasattr(cmd, "binding") else "未分類"
-            grouped.setdefault(cog_name, []).append(cmd)
+    @app_commands.describe(command="要查詢的指令（選填）")
+    async def help_command(self, interaction: discord.Interaction, command: Optional[str] = None):
+        if command:
+            embed = self.catalogue.command_embed(command.lstrip("/"))
+            if embed is None:
+                await interaction.response.send_message(f"❌ 找不到指令 `{command}`。", ephemeral=True)
+                return
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+            return
 
-        embed = discord.Embed(
-            title="📖 指令總覽",
-            description="請從下拉選單中選擇一個分類",
-            color=discord.Color.green()
+        await interaction.response.send_message(
+            embed=self.catalogue.overview, view=HelpView(self.catalogue), ephemeral=True
         )
-        await interaction.response.send_message(embed=embed, view=HelpView(grouped), ephemeral=True)
+
+    @help_command.autocomplete("command")
+    async def help_command_autocomplete(self, interaction: discord.Interaction, current: str):
+        return [app_commands.Choice(name=name, value=name) for name in self.catalogue.search(current)]
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Help(bot))
@@ -1,42 +1,168 @@
 import os
-import json
+import time
 import asyncio
+import tempfile
 from datetime import datetime, timedelta
 import discord
 from discord import app_commands
 from discord.ext import commands
 from typing import Optional
+from functools import partial
+from dataclasses import replace
+from utils.log_store import open_log_store, migrate_json_array, migrate_jsonl
+from utils.export import export_records
+from utils.scheduler import ExpiryScheduler
+from utils.user_cache import UserCache
+from utils.stats import GuildStats
+from utils.sharding import shard_config, owns_guild, partition_path
+from utils.session_journal import SessionJournal
+from utils.metrics import metrics
+from utils.seat_board import SeatBoard
+from utils.batcher import Coalescer
+from utils.actor import GuildActor
+from utils.pipeline import SideEffects
+from utils.notifier import DMNotifier
+from utils.records import LogRecord, Session, elapsed_minutes, now_epoch
+from utils.voice_bell import VoiceBell
+from utils.seating import Layout, Room, load_layouts, layout_for, row_name
 
 # ========= 資料結構 =========
-sessions = {}   # user_id -> {start, end, object, notify_channel_id, task}
-SEATS = [chr(ord('A') + i) for i in range(9)]  # A~I
-seat_assign = {}
-LOG_FILE = "learning_log.json"
+class GuildState:
+    """單一伺服器的自習狀態；每個語音頻道是一間教室，各自一張座位表"""
+
+    def __init__(self, guild_id: int):
+        self.guild_id = guild_id
+        self.sessions = {}   # user_id -> Session
+        self.rooms = {}      # 語音頻道 ID -> Room
+        self.actor = GuildActor(self)   # sessions / rooms 的修改一律經由 actor 依序執行
+
+guild_states = {}   # guild_id -> GuildState，只包含本行程負責的伺服器
+
+def get_state(guild_id: int) -> GuildState:
+    state = guild_states.get(guild_id)
+    if state is None:
+        state = guild_states[guild_id] = GuildState(guild_id)
+    return state
+
+def get_room(state: GuildState, room_id: Optional[int]) -> Room:
+    room = state.rooms.get(room_id)
+    if room is None:
+        room = state.rooms[room_id] = Room(room_id, layout_for(LAYOUTS, state.guild_id, room_id))
+    return room
+
+LAYOUT_FILE = os.getenv("LAYOUT_FILE", "layouts.json")
+LAYOUTS = load_layouts(LAYOUT_FILE)   # 教室座位配置，沒有設定檔時為 3x3
+SHARD_IDS, SHARD_COUNT = shard_config()
+LEGACY_GUILD_ENV = os.getenv("GUILD_ID", "").strip()
+LEGACY_GUILD_ID = int(LEGACY_GUILD_ENV) if LEGACY_GUILD_ENV.isdigit() else None   # 舊紀錄沒有 guild_id，遷移時補上
+LOG_FILE = "learning_log.json"   # 舊版 JSON 陣列檔，只用於一次性遷移
+LOG_BACKEND = os.getenv("LOG_BACKEND", "segmented")   # segmented / jsonl / sqlite
+DEFAULT_LOG_PATHS = {"segmented": "learning_log", "jsonl": "learning_log.jsonl", "sqlite": "learning_log.db"}
+LOG_PATH = partition_path(os.getenv("LOG_PATH", DEFAULT_LOG_PATHS.get(LOG_BACKEND, "learning_log")), SHARD_IDS)
+FLAT_LOG_PATH = partition_path(DEFAULT_LOG_PATHS["jsonl"], SHARD_IDS)   # 改用 segmented 前的單一 JSONL 檔
+log_store = open_log_store(LOG_BACKEND, LOG_PATH)
+EXPORT_SIZE_LIMIT = 10 * 1024 * 1024   # 無法取得伺服器上限時的附件大小上限
+JOURNAL_PATH = partition_path(os.getenv("JOURNAL_PATH", "session_journal.jsonl"), SHARD_IDS)
+journal = SessionJournal(JOURNAL_PATH)   # 進行中自習的事件日誌，重啟 / 重新載入時還原
+expiry = ExpiryScheduler()   # 所有自習的到期時間共用一個排程器，key 為 (guild_id, user_id)
+users = UserCache()          # 座位表與提醒共用的使用者查詢快取
+expiry_warnings = ExpiryScheduler()   # 到期前提醒，key 為 (guild_id, user_id, 提前分鐘數)
+WARN_MINUTES = sorted({int(m) for m in os.getenv("WARN_MINUTES", "5").split(",") if m.strip().isdigit() and int(m) > 0})
+notifier = DMNotifier()      # 所有私訊經由佇列送出，失敗不影響結算
+stats = GuildStats()         # 各伺服器的累計學習統計，save_log 時增量更新
+seat_board = SeatBoard()     # 每個頻道一則即時座位表，變動合併後 edit
+finalizer = Coalescer(window=1.0)   # 到期 / 離開語音 / 統一結束的自習，短時間內合併結算
+bell = VoiceBell(os.getenv("BELL_FILE", "bell.mp3"))   # 自習時間到時在教室語音頻道響鈴，音訊只編碼一次
+side_effects = SideEffects()   # 互動回覆後才執行的寫檔 / 重繪 / 後續訊息
+side_effects.on_error = lambda label, e: metrics.error("side_effect", label)
 
 # =========== 存檔 ===========
-def save_log(user_id: int, username: str, object: str, start: datetime, end: datetime, minutes: int):
-    record = {
-        "user_id": user_id,
-        "username": username,
-        "object": object,
-        "start": start.isoformat(),
-        "end": end.isoformat(),
-        "minutes": minutes,
-    }
+def observe_log_write(loop: asyncio.AbstractEventLoop, n: int, seconds: float):
+    # on_write 在寫入執行緒呼叫；metrics 只在事件迴圈上修改，避免輸出時 dict 大小改變
     try:
-        if os.path.exists(LOG_FILE):
-            with open(LOG_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        else:
-            data = []
-        data.append(record)
-        with open(LOG_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print("save_log error:", e)
+        loop.call_soon_threadsafe(metrics.observe, "log_write", seconds)
+    except RuntimeError:
+        pass   # 事件迴圈已關閉
+
+def make_record(guild_id: int, user_id: int, username: str, object: str, start: int, end: int, minutes: int) -> LogRecord:
+    # 時間一律是 epoch 秒
+    return LogRecord(guild_id, user_id, username, object, start, end, minutes)
+
+def save_log(guild_id: int, user_id: int, username: str, object: str, start: int, end: int, minutes: int):
+    record = make_record(guild_id, user_id, username, object, start, end, minutes)
+    # 只排入佇列，實際寫檔由背景執行緒處理
+    log_store.append(record)
+    stats.add(record)
+
+def save_logs(records: list):
+    # 一起排入佇列，寫入執行緒會在同一批寫完
+    log_store.append_many(records)
+    for record in records:
+        stats.add(record)
+
+async def commit_finished(items: list):
+    """紀錄確認落盤後才在自習日誌寫 finish；在這之前當機，重啟時會從日誌還原並重新結算"""
+    if not await log_store.flush_async():
+        print(f"⚠️ 學習紀錄未確認寫入，保留 {len(items)} 個自習於日誌中待重啟結算")
+        return
+    for i in items:
+        journal.record_finish(i["guild_id"], i["user_id"], i["start"])
         
 # ========= 顯示座位 =========
-async def render_seat_map(bot: commands.Bot) -> str:
+BOX_MAX_ROWS = 4   # 小教室沿用格子圖，超過就改用每排一行的精簡表格
+BOX_MAX_COLS = 4
+PAGE_CHARS = 1800  # 訊息上限 2000 字，扣掉標題與 code block
+
+def room_title(bot: commands.Bot, room: Room) -> str:
+    if room.layout.name:
+        return room.layout.name
+    ch = bot.get_channel(room.room_id) if room.room_id else None
+    return ch.name if ch else "教室"
+
+def page_count(room: Room) -> int:
+    layout = room.layout
+    if layout.rows <= BOX_MAX_ROWS and layout.cols <= BOX_MAX_COLS:
+        return 1
+    return -(-layout.rows // rows_per_page(layout)) * col_pages(layout)
+
+def cols_per_page(layout: Layout) -> int:
+    # 一頁至少要放得下 Board、座號與一排共三行，太寬的教室再依座號切頁
+    return min(layout.cols, (PAGE_CHARS // 3 - 4) // 5)
+
+def col_pages(layout: Layout) -> int:
+    return -(-layout.cols // cols_per_page(layout))
+
+def rows_per_page(layout: Layout) -> int:
+    line_len = 4 + 5 * cols_per_page(layout)
+    return max(1, PAGE_CHARS // line_len - 2)
+
+async def occupant_name(bot: commands.Bot, room: Room, index: int) -> Optional[str]:
+    uid = room.seat_occupant.get(index)
+    if uid is None:
+        return None
+    u = await users.resolve(bot, uid)
+    return (str(u) if u else f"{str(uid)[-4:]}")[:4]
+
+async def render_seat_map(bot: commands.Bot, room: Room, page: int = 0) -> str:
+    # 座位沒變動就直接回傳快取
+    version = room.version
+    cached = cached_seat_map(room, page)
+    if cached is not None:
+        return cached
+
+    layout = room.layout
+    if layout.rows <= BOX_MAX_ROWS and layout.cols <= BOX_MAX_COLS:
+        text = await render_box(bot, room)
+    else:
+        text = await render_compact(bot, room, page)
+
+    # fetch_user 期間座位若又變動，這份結果已過期，不寫入快取
+    if version == room.version:
+        room.cache[page] = (version, text)
+    return text
+
+async def render_box(bot: commands.Bot, room: Room) -> str:
+    layout = room.layout
     lines = []
     # 黑板 + 講台
     lines.append("──────────────────── Board ────────────────────")
@@ -44,23 +170,14 @@ async def render_seat_map(bot: commands.Bot) -> str:
     lines.append("│         Stage         │")
     lines.append("└───────────────────────┘")
 
-    for r in range(3):
+    for r in range(layout.rows):
         top = []
         mid = []
         bot_line = []
-        for c in range(3):
-            seat = SEATS[r*3 + c]
-            occ = None
-            for uid, s in seat_assign.items():
-                if s == seat:
-                    u = bot.get_user(uid)
-                    if not u:
-                        try:
-                            u = await bot.fetch_user(uid)
-                        except:
-                            pass
-                    occ = (str(u) if u else f"{str(uid)[-4:]}")[:4]
-                    break
+        for c in range(layout.cols):
+            index = r * layout.cols + c
+            seat = layout.label(index)
+            occ = await occupant_name(bot, room, index)
 
             # 格子設計
             top.append("┌────────┐")
@@ -83,55 +200,350 @@ async def render_seat_map(bot: commands.Bot) -> str:
 
     return "\n".join(centered_lines)
 
-# ========= 建立計時器 =========
-async def schedule_reminder(bot: commands.Bot, user_id: int):
-    old = sessions[user_id].get("task")
-    if old and not old.done():
-        old.cancel()
-
-    async def _task():
-        while True:
-            now = datetime.now()
-            end = sessions[user_id]["end"]
-            remain = (end - now).total_seconds()
-            if remain <= 0:
-                break
-            await asyncio.sleep(min(30, remain))
-
-        sess = sessions.get(user_id)
-        if not sess:
-            return
-        user = bot.get_user(user_id) or await bot.fetch_user(user_id)
-        start = sess["start"]
-        end = datetime.now()
-        minutes = max(1, int((end - start).total_seconds() // 60))
-        object = sess["object"]
-
-        seat_assign.pop(user_id, None)
-        sessions.pop(user_id, None)
-
-        seatmap_str = await render_seat_map(bot)
-        ch = bot.get_channel(sess["notify_channel_id"])
-        if ch:
-            await ch.send(
-                f"⏰ {user.mention} 自習時間結束，實際學習{format_object(object)} {minutes} 分鐘。\n\n"
-                f"🪑 目前座位表：\n```\n{seatmap_str}\n```"
-            )
+async def render_compact(bot: commands.Bot, room: Room, page: int) -> str:
+    # 大教室：每排一行，每格顯示 4 個字的名字，依排分頁；太寬時同一排再依座號分頁
+    layout = room.layout
+    per_page, width = rows_per_page(layout), cols_per_page(layout)
+    row_page, col_page = divmod(page, col_pages(layout))
+    first = row_page * per_page
+    rows = range(first, min(layout.rows, first + per_page))
+    cols = range(col_page * width, min(layout.cols, (col_page + 1) * width))
+
+    lines = ["Board".center(4 + 5 * len(cols), "─")]
+    lines.append("    " + " ".join(f"{c + 1:<4}" for c in cols))
+    for r in rows:
+        cells = []
+        for c in cols:
+            occ = await occupant_name(bot, room, r * layout.cols + c)
+            cells.append(f"{occ:<4}" if occ else "····")
+        lines.append(f"{row_name(r):<3} " + " ".join(cells))
+    lines.append(f"{len(room.seat_assign)}/{layout.size} 人　第 {page + 1}/{page_count(room)} 頁")
+    return "\n".join(lines)
+
+def cached_seat_map(room: Room, page: int = 0) -> Optional[str]:
+    """座位沒變動時回傳快取的座位圖，否則回傳 None（需要重繪）"""
+    cached = room.cache.get(page)
+    return cached[1] if cached and cached[0] == room.version else None
+
+# ========= 即時座位表 =========
+def format_seatmap(bot: commands.Bot, room: Room, text: str) -> str:
+    return f"🪑 目前座位表（{room_title(bot, room)}）：\n```\n{text}\n```"
+
+async def seatmap_message(bot: commands.Bot, room: Room, page: int = 0) -> str:
+    return format_seatmap(bot, room, await render_seat_map(bot, room, page))
+
+def refresh_seat_board(bot: commands.Bot, room: Room, channel):
+    # 座位表不再跟著每則通知重發，改為更新頻道中該教室的看板；大教室每頁一則，內容沒變的頁不會 edit
+    if channel is not None:
+        for page in range(page_count(room)):
+            seat_board.update(channel, partial(seatmap_message, bot, room, page), key=(channel.id, room.room_id, page))
+
+# ========= 快速回覆 =========
+async def ack(interaction: discord.Interaction, content: str = None, *, defer: bool = False, **kwargs):
+    """先回覆互動（或 defer），慢的後續動作交給 side_effects；記錄從收到互動到回覆的延遲"""
+    if defer:
+        await interaction.response.defer(thinking=True, **kwargs)
+    else:
+        await interaction.response.send_message(content, **kwargs)
+    started = getattr(interaction, "extras", {}).get("started")
+    command = getattr(interaction, "command", None)
+    if started is not None and command is not None:
+        metrics.observe("interaction_ack", time.perf_counter() - started, command.qualified_name)
+
+def report_to(interaction: discord.Interaction, what: str):
+    """背景動作失敗時，以 followup 私訊告知使用者"""
+    async def report(error: Exception):
+        await interaction.followup.send(f"⚠️ {what}失敗，請稍後再試。", ephemeral=True)
+    return report
 
-        await user.send(f"⏰ 你的自習時間到囉！實際學習{format_object(object)} {minutes} 分鐘。")
-
-        save_log(user_id, user.name if user else str(user_id), sess["object"], start, end, minutes)
+# ========= 建立計時器 =========
+def schedule_reminder(state: GuildState, user_id: int):
+    # 新增或改期都只是一次堆積插入，由 expiry 的單一 sleeper 負責到期
+    sess = state.sessions[user_id]
+    expiry.schedule((state.guild_id, user_id), sess.end)
+    # 提前提醒也放進同一種堆積排程，不另開 task；已經過了的提醒點取消
+    now = now_epoch()
+    for minutes in WARN_MINUTES:
+        key = (state.guild_id, user_id, minutes)
+        at = sess.end - minutes * 60
+        if at > now and sess.end - sess.start > minutes * 60:
+            expiry_warnings.schedule(key, at)
+        else:
+            expiry_warnings.cancel(key)
+
+def cancel_reminders(state: GuildState, user_id: int):
+    expiry.cancel((state.guild_id, user_id))
+    for minutes in WARN_MINUTES:
+        expiry_warnings.cancel((state.guild_id, user_id, minutes))
+
+async def warn_session(bot: commands.Bot, key: tuple):
+    guild_id, user_id, minutes = key
+    sess = get_state(guild_id).sessions.get(user_id)
+    if sess is None:
+        return
+    remaining = sess.end - now_epoch()
+    if remaining > 0:
+        notifier.send(user_id, f"⏳ 你的自習{format_object(sess.object)}還剩 {max(1, round(remaining / 60))} 分鐘。")
+
+async def expire_session(bot: commands.Bot, key: tuple):
+    guild_id, user_id = key
+    item = await get_state(guild_id).actor.call(expire_session_op, user_id)
+    if not item:
+        return
+    user = await users.resolve(bot, user_id)
+    item["username"] = user.name if user else str(user_id)
+    item["mention"] = user.mention if user else f"<@{user_id}>"
+    finalizer.add(item)
+
+    # 結算已交給 finalizer；私訊只是排入佇列，送不到也不影響紀錄
+    notifier.send(user_id, f"⏰ 你的自習時間到囉！實際學習{format_object(item['object'])} {item['minutes']} 分鐘。")
+
+# ========= 狀態操作 =========
+# 以下函式只由 GuildActor 的 consumer 呼叫（啟動還原除外），同一伺服器的修改不會交錯
+def begin_session(state: GuildState, user_id: int, duration: int, object: Optional[str],
+                  channel_id: int, room_id: int) -> Optional[tuple]:
+    """開始自習並分配座位，回傳 (教室, 座位)；已在自習中則回傳 None"""
+    if user_id in state.sessions:
+        return None
+    start = now_epoch()
+    sess = state.sessions[user_id] = Session(start, start + duration * 60, object, channel_id, room_id)
+    # 每個語音頻道是一間教室，分配最前面的空位
+    room = get_room(state, room_id)
+    index = room.assign(user_id)
+    seat = None if index is None else room.layout.label(index)
+    journal.record_start(state.guild_id, user_id, sess, seat)
+    schedule_reminder(state, user_id)
+    return room, seat
+
+def extend_session(state: GuildState, user_id: int, minutes: int) -> bool:
+    sess = state.sessions.get(user_id)
+    if not sess:
+        return False
+    sess.end += minutes * 60
+    journal.record_update(state.guild_id, user_id, sess)
+    schedule_reminder(state, user_id)
+    return True
+
+def edit_session(state: GuildState, user_id: int, duration: Optional[int], object: Optional[str]) -> Optional[Session]:
+    """修改時長或項目，回傳修改後的複本"""
+    sess = state.sessions.get(user_id)
+    if not sess:
+        return None
+    if duration is not None:
+        sess.end = sess.start + duration * 60
+    if object is not None:
+        sess.object = object
+    journal.record_update(state.guild_id, user_id, sess)
+    schedule_reminder(state, user_id)
+    return replace(sess)
+
+def expire_session_op(state: GuildState, user_id: int) -> Optional[dict]:
+    """計時到期時的結算；排在前面的延長 / 修改已經改期的話不動作"""
+    sess = state.sessions.get(user_id)
+    if not sess or sess.end > now_epoch() or (state.guild_id, user_id) in expiry:
+        return None
+    return end_session(state, user_id, "timeout")
+
+def end_all_sessions(state: GuildState, reason: str) -> list:
+    return [end_session(state, user_id, reason) for user_id in list(state.sessions)]
+
+# ========= 結算 =========
+def end_session(state: GuildState, user_id: int, reason: str) -> Optional[dict]:
+    """把自習從狀態中移除並回傳結算資料；只改記憶體狀態與排入日誌，不做 I/O。
+    日誌的 finish 由 commit_finished 在紀錄寫入後補上"""
+    sess = state.sessions.pop(user_id, None)
+    if not sess:
+        return None
+    cancel_reminders(state, user_id)
+    get_room(state, sess.room).release(user_id)
+
+    # 先把實際結束時間寫進日誌：紀錄落盤前當機的話，重啟時會當作已到期依此結算
+    end = sess.end = now_epoch()
+    journal.record_update(state.guild_id, user_id, sess)
+    return {
+        "guild_id": state.guild_id,
+        "user_id": user_id,
+        "username": str(user_id),
+        "mention": f"<@{user_id}>",
+        "object": sess.object,
+        "start": sess.start,
+        "end": end,
+        "minutes": elapsed_minutes(sess.start, end),
+        "notify_channel_id": sess.notify_channel_id,
+        "room": sess.room,
+        "reason": reason,
+    }
 
-    sessions[user_id]["task"] = asyncio.create_task(_task())
+FINISH_NOTICES = {
+    "timeout": "⏰ {mention} 自習時間結束，實際學習{object} {minutes} 分鐘。",
+    "voice": "🚶 {mention} 已離開語音，自動結束自習，實際學習{object} {minutes} 分鐘。",
+    "closeout": "🔔 {mention} 的自習已統一結束，實際學習{object} {minutes} 分鐘。",
+}
+REASON_NAMES = {"timeout": "時間到", "voice": "離開語音", "closeout": "統一結束"}
+
+async def announce_finished(ch, group: list):
+    if len(group) == 1:
+        i = group[0]
+        await ch.send(FINISH_NOTICES[i["reason"]].format(
+            mention=i["mention"], object=format_object(i["object"]), minutes=i["minutes"]
+        ))
+        return
+    lines = [
+        f"• {i['mention']}{format_object(i['object'])} {i['minutes']} 分鐘（{REASON_NAMES[i['reason']]}）"
+        for i in group
+    ]
+    for chunk in chunk_lines([f"📋 {len(group)} 位同學結束自習："] + lines):
+        await ch.send(chunk, allowed_mentions=discord.AllowedMentions.none())
+
+async def finalize_batch(bot: commands.Bot, items: list):
+    """一批結算：紀錄一次寫入，每個通知頻道只發一則彙整訊息、更新一次座位表"""
+    save_logs([
+        make_record(i["guild_id"], i["user_id"], i["username"], i["object"], i["start"], i["end"], i["minutes"])
+        for i in items
+    ])
+    await commit_finished(items)
+
+    by_channel = {}
+    for i in items:
+        by_channel.setdefault((i["guild_id"], i["notify_channel_id"]), []).append(i)
+    for (guild_id, channel_id), group in by_channel.items():
+        ch = bot.get_channel(channel_id)
+        if not ch:
+            continue
+        # 一個頻道發送失敗（沒權限、被刪除）不影響其他頻道的公告與座位表
+        try:
+            await announce_finished(ch, group)
+        except Exception as e:
+            metrics.error("finalize", "notice")
+            print(f"finish notice to {channel_id} failed:", e)
+        try:
+            state = get_state(guild_id)
+            for room_id in {i["room"] for i in group}:
+                refresh_seat_board(bot, get_room(state, room_id), ch)
+        except Exception as e:
+            metrics.error("finalize", "seat_board")
+            print(f"seat board refresh for {channel_id} failed:", e)
+
+    # 時間到的教室響一次鈴，同一頻道短時間內多人到期由 bell 合併
+    for room_id in {i["room"] for i in items if i["reason"] == "timeout" and i["room"]}:
+        bell.ring(bot.get_channel(room_id))
 
 # =========== 格式化輸出 ===========
 def format_object(object: Optional[str]) -> str:
     return f" **{object}**" if object else ""
 
+def format_minutes(minutes: int) -> str:
+    hours, mins = divmod(minutes, 60)
+    return f"{hours} 小時 {mins} 分鐘" if hours else f"{mins} 分鐘"
+
+def chunk_lines(lines: list, limit: int = 1900) -> list:
+    # 訊息上限 2000 字，依行切成多則
+    chunks, current = [], ""
+    for line in lines:
+        if current and len(current) + len(line) + 1 > limit:
+            chunks.append(current)
+            current = ""
+        current = f"{current}\n{line}" if current else line
+    if current:
+        chunks.append(current)
+    return chunks
+
+PERIOD_NAMES = {"all": "總計", "week": "本週", "today": "今日"}
+
 # =========== 指令 ===========
 class Study(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+
+    async def cog_load(self):
+        metrics.set_gauge("active_sessions", lambda: sum(len(s.sessions) for s in guild_states.values()))
+        metrics.set_gauge("pending_expiries", lambda: len(expiry))
+        metrics.set_gauge("actor_queue", lambda: sum(len(s.actor) for s in guild_states.values()))
+        metrics.set_gauge("pending_side_effects", lambda: len(side_effects))
+        metrics.set_gauge("pending_dms", lambda: len(notifier))
+        metrics.set_gauge("user_cache_hits", lambda: users.hits)
+        metrics.set_gauge("user_cache_misses", lambda: users.misses)
+        metrics.set_gauge("user_cache_size", lambda: len(users))
+        log_store.on_write = partial(observe_log_write, asyncio.get_running_loop())
+        log_store.start()
+        expiry.start(partial(expire_session, self.bot))
+        expiry_warnings.start(partial(warn_session, self.bot))
+        notifier.start(partial(users.resolve, self.bot))
+        notifier.on_event = lambda kind: metrics.error("dm", kind)
+        finalizer.start(partial(finalize_batch, self.bot))
+        await bell.load()
+        # 多行程部署時，只有負責原本那個伺服器的行程會遷移舊檔
+        if owns_guild(LEGACY_GUILD_ID, SHARD_IDS, SHARD_COUNT):
+            migrated = await asyncio.to_thread(migrate_json_array, LOG_FILE, log_store, {"guild_id": LEGACY_GUILD_ID})
+        else:
+            migrated = 0
+        if migrated:
+            print(f"📦 已將 {migrated} 筆紀錄從 {LOG_FILE} 遷移到 {LOG_PATH}")
+        if LOG_BACKEND == "segmented":
+            migrated = await asyncio.to_thread(migrate_jsonl, FLAT_LOG_PATH, log_store)
+            if migrated:
+                print(f"📦 已將 {migrated} 筆紀錄從 {FLAT_LOG_PATH} 切段到 {LOG_PATH}")
+        # 統計只在啟動時掃一次紀錄，之後由 save_log 增量更新
+        loaded = await asyncio.to_thread(stats.rebuild, log_store.iter_records())
+        print(f"📊 已從 {LOG_PATH} 載入 {loaded} 筆學習紀錄")
+        await self.restore_sessions()
+
+    async def restore_sessions(self):
+        """重播自習日誌：還原進行中的自習，停機期間已到期的一次結算"""
+        active = await asyncio.to_thread(journal.load)
+        journal.start()
+        now = now_epoch()
+        restored = 0
+        expired = []
+        for (guild_id, user_id), (sess, seat) in active.items():
+            state = get_state(guild_id)
+            if sess.end <= now:
+                # 停機期間到期，以預定結束時間記錄
+                user = self.bot.get_user(user_id)
+                save_log(guild_id, user_id, user.name if user else str(user_id), sess.object,
+                         sess.start, sess.end, elapsed_minutes(sess.start, sess.end))
+                expired.append({"guild_id": guild_id, "user_id": user_id, "start": sess.start})
+                continue
+            state.sessions[user_id] = sess
+            if seat:
+                room = get_room(state, sess.room)
+                index = room.layout.index(seat)
+                if index is not None:
+                    room.assign(user_id, index)
+            schedule_reminder(state, user_id)
+            restored += 1
+        if expired:
+            await commit_finished(expired)
+        if restored or expired:
+            print(f"♻️ 已還原 {restored} 個自習，結算 {len(expired)} 個停機期間到期的自習")
+
+    async def cog_unload(self):
+        expiry.stop()
+        expiry_warnings.stop()
+        # 先讓各伺服器已排隊的操作執行完，結算項目才會進到 finalizer
+        await asyncio.gather(*(state.actor.close() for state in guild_states.values()))
+        await side_effects.drain()
+        await notifier.close()
+        await finalizer.close()
+        seat_board.close()
+        await bell.close(self.bot.guilds)
+        metrics.remove_gauge("active_sessions")
+        metrics.remove_gauge("pending_expiries")
+        metrics.remove_gauge("actor_queue")
+        metrics.remove_gauge("pending_side_effects")
+        metrics.remove_gauge("pending_dms")
+        for name in ("user_cache_hits", "user_cache_misses", "user_cache_size"):
+            metrics.remove_gauge(name)
+        await asyncio.to_thread(journal.close)
+        # 等待佇列中的紀錄寫完再卸載
+        await asyncio.to_thread(log_store.close)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # 自習狀態依伺服器分開，私訊中無法使用
+        if interaction.guild_id is None:
+            await interaction.response.send_message("❌ 請在伺服器中使用這個指令。", ephemeral=True)
+            return False
+        return True
     
     # =========== 開始計時學習時間 ===========
     @app_commands.command(
@@ -147,35 +559,23 @@ class Study(commands.Cog):
         if duration <= 0:
             await interaction.response.send_message("❌ duration 需為正整數。", ephemeral=True)
             return
-        if interaction.user.id in sessions:
+        state = get_state(interaction.guild_id)
+        started = await state.actor.call(
+            begin_session, interaction.user.id, duration, object,
+            interaction.channel.id, interaction.user.voice.channel.id
+        )
+        if started is None:
             await interaction.response.send_message("⚠️ 你已經在自習中，使用 `/add_learning_time` 來增加自習時間，或 `/finish_learning` 來結束自習。", ephemeral=True)
             return
-    
-        start = datetime.now()
-        end = start + timedelta(minutes=duration)
-        sessions[interaction.user.id] = {
-            "start": start,
-            "end": end,
-            "object": object,
-            "notify_channel_id": interaction.channel.id,
-            "task": None,
-        }
-    
-        used = set(seat_assign.values())
-        seat = next((s for s in SEATS if s not in used), None)
-        if seat is None:
-            seat_text = "（座位已滿，暫無法入座）"
-        else:
-            seat_assign[interaction.user.id] = seat
-            seat_text = f"🪑 你已入座 **{seat}**。"
 
-        seatmap_str = await render_seat_map(self.bot)
-
-        await interaction.response.send_message(
+        room, seat = started
+        seat_text = "（座位已滿，暫無法入座）" if seat is None else f"🪑 你已入座 **{seat}**。"
+        await ack(
+            interaction,
             f"📚 {interaction.user.mention} 開始學習{format_object(object)} {duration} 分鐘。\n"
-            f"{seat_text}\n\n🪑 目前座位表：\n```\n{seatmap_str}\n```"
+            f"{seat_text}"
         )
-        await schedule_reminder(self.bot, interaction.user.id)
+        refresh_seat_board(self.bot, room, interaction.channel)
     
     # =========== 延長學習時間 ===========
     @app_commands.command(
@@ -185,12 +585,11 @@ class Study(commands.Cog):
     )
     @app_commands.describe(time="延長的分鐘數（必填）")
     async def add_learning_time(self, interaction: discord.Interaction, time: int):
-        if interaction.user.id not in sessions:
+        state = get_state(interaction.guild_id)
+        if not await state.actor.call(extend_session, interaction.user.id, time):
             await interaction.response.send_message("⚠️ 你沒有正在進行的自習。", ephemeral=True)
             return
-        sessions[interaction.user.id]["end"] += timedelta(minutes=time)
         await interaction.response.send_message(f"⏫ 已為你延長 {time} 分鐘。")
-        await schedule_reminder(self.bot, interaction.user.id)
     
     # =========== 編輯學習資訊 ===========
     @app_commands.command(
@@ -200,29 +599,19 @@ class Study(commands.Cog):
     )
     @app_commands.describe(duration="學習時間（分鐘）（選填）", object="學習項目（選填）")
     async def edit_information(self, interaction: discord.Interaction, duration: Optional[int] = None, object: Optional[str] = None):
-        if interaction.user.id not in sessions:
+        if duration is not None and duration <= 0:
+            await interaction.response.send_message("❌ duration 需為正整數。", ephemeral=True)
+            return
+        state = get_state(interaction.guild_id)
+        sess = await state.actor.call(edit_session, interaction.user.id, duration, object)
+        if not sess:
             await interaction.response.send_message("⚠️ 你沒有正在進行的自習。", ephemeral=True)
             return
-        
-        sess = sessions[interaction.user.id]
-        old_object = sess["object"]
-        old_end = sess["end"]
-    
-        if duration is not None:
-            if duration <= 0:
-                await interaction.response.send_message("❌ duration 需為正整數。", ephemeral=True)
-                return
-            sess["end"] = sess["start"] + timedelta(minutes=duration)
-        
-        if object is not None:
-            sess["object"] = object
-        
-        await schedule_reminder(self.bot, interaction.user.id)
 
-        minutes = max(1, int((sess['end'] - sess['start']).total_seconds() // 60))
+        minutes = elapsed_minutes(sess.start, sess.end)
         await interaction.response.send_message(
             f"✏️ {interaction.user.mention} 已更新自習資訊。\n"
-            f"📚 已改為學習{format_object(sess['object'])} {minutes} 分鐘。\n"
+            f"📚 已改為學習{format_object(sess.object)} {minutes} 分鐘。\n"
         )
 
     # =========== 結束學習 ===========
@@ -232,74 +621,97 @@ class Study(commands.Cog):
         extras={"example": "/finish_learning"}
     )
     async def finish_learning(self, interaction: discord.Interaction):
-        sess = sessions.pop(interaction.user.id, None)
-        if not sess:
+        state = get_state(interaction.guild_id)
+        item = await state.actor.call(end_session, interaction.user.id, "finish")
+        if not item:
             await interaction.response.send_message("⚠️ 你沒有正在進行的自習。", ephemeral=True)
             return
-        
-        task = sess.get("task")
-        if task and not task.done():
-            task.cancel()
-
-        start = sess["start"]
-        end = datetime.now()
-        minutes = max(1, int((end - start).total_seconds() // 60))
-        object = sess["object"]
-        seat_assign.pop(interaction.user.id, None)
-        user = interaction.user
-        save_log(user.id, user.name, object, start, end, minutes)
 
-        seatmap_str = await render_seat_map(self.bot)
-        await interaction.response.send_message(
-            f"🚶 {user.mention} 結束自習，實際學習{format_object(object)} {minutes} 分鐘。\n"
-            f"🪑 目前座位表：\n```\n{seatmap_str}\n```"
+        # 狀態已在 actor 中結算，先回覆，寫紀錄與更新座位表放到背景
+        user = interaction.user
+        await ack(interaction, f"🚶 {user.mention} 結束自習，實際學習{format_object(item['object'])} {item['minutes']} 分鐘。")
+        side_effects.run(
+            "finish_learning", self.after_finish(state, item, user, interaction.channel),
+            report_to(interaction, "學習紀錄儲存")
         )
+
+    async def after_finish(self, state: GuildState, item: dict, user, channel):
+        save_log(state.guild_id, user.id, user.name, item["object"], item["start"], item["end"], item["minutes"])
+        await commit_finished([item])
+        refresh_seat_board(self.bot, get_room(state, item["room"]), channel)
     
     # =========== 退出語音時停止自習 ===========
     @commands.Cog.listener()
     async def on_voice_state_update(self, member: discord.Member, before: discord.VoiceState, after: discord.VoiceState):
         # 如果使用者沒有正在自習，忽略
-        if member.id not in sessions:
+        state = guild_states.get(member.guild.id)
+        if state is None or member.id not in state.sessions:
             return
 
         # before.channel != None 表示「原本在語音」
         # after.channel == None 表示「已經離開語音」
         if before.channel is not None and after.channel is None:
-            sess = sessions.pop(member.id, None)
-            if not sess:
+            item = await state.actor.call(end_session, member.id, "voice")
+            if not item:
                 return
-
-            task = sess.get("task")
-            if task and not task.done():
-                task.cancel()
-
-            start = sess["start"]
-            end = datetime.now()
-            minutes = max(1, int((end - start).total_seconds() // 60))
-            object = sess["object"]
-
-            seat_assign.pop(member.id, None)
-            save_log(member.id, member.name, object, start, end, minutes)
-
-            seatmap_str = await render_seat_map(self.bot)
-
-            # 公告到 notify_channel
-            ch = self.bot.get_channel(sess["notify_channel_id"])
-            if ch:
-                await ch.send(
-                    f"🚶 {member.mention} 已離開語音，自動結束自習，實際學習{format_object(object)} {minutes} 分鐘。\n"
-                    f"🪑 目前座位表：\n```\n{seatmap_str}\n```"
-                )
+            item["username"] = member.name
+            item["mention"] = member.mention
+            # 交給批次結算，同時離開的人合併寫檔與公告
+            finalizer.add(item)
+
+    # =========== 統一結束自習 ===========
+    @commands.command(name="close_all")
+    @commands.is_owner()
+    async def close_all(self, ctx: commands.Context):
+        """結束目前伺服器（私訊中使用則為全部伺服器）所有進行中的自習"""
+        states = [get_state(ctx.guild.id)] if ctx.guild else list(guild_states.values())
+        count = 0
+        for state in states:
+            for item in await state.actor.call(end_all_sessions, "closeout"):
+                user_id = item["user_id"]
+                user = self.bot.get_user(user_id)
+                if user:
+                    item["username"] = user.name
+                    item["mention"] = user.mention
+                finalizer.add(item)
+                count += 1
+        await finalizer.flush()
+        await ctx.send(f"🔔 已結束 {count} 個自習。")
 
     # =========== 查看座位表 ===========
     @app_commands.command(
         name="show_seatmap", 
         description="查看目前座位表",
-        extras={"example": "/show_seatmap"}
+        extras={"example": "/show_seatmap [page]2"}
     )
-    async def show_seatmap(self, interaction: discord.Interaction):
-        seatmap_str = await render_seat_map(self.bot)
-        await interaction.response.send_message(f"🪑 目前座位表：\n```\n{seatmap_str}\n```", ephemeral=True)
+    @app_commands.describe(page="頁碼，大教室才需要（選填）")
+    async def show_seatmap(self, interaction: discord.Interaction, page: Optional[int] = None):
+        state = get_state(interaction.guild_id)
+        # 優先顯示所在語音頻道的教室，其次是自己入座的教室
+        voice = getattr(interaction.user, "voice", None)
+        sess = state.sessions.get(interaction.user.id)
+        if voice and voice.channel:
+            room_id = voice.channel.id
+        elif sess:
+            room_id = sess.room
+        else:
+            room_id = next(iter(state.rooms), None)
+        # 唯讀查詢：教室只由 actor 建立，這裡沒有就用暫時的空教室顯示
+        room = state.rooms.get(room_id) or Room(room_id, layout_for(LAYOUTS, state.guild_id, room_id))
+        page = min(max(1, page or 1), page_count(room)) - 1
+        # 有快取就直接回覆；要重繪（可能等 fetch_user）就先 defer，畫好再 followup
+        text = cached_seat_map(room, page)
+        if text is not None:
+            await ack(interaction, format_seatmap(self.bot, room, text), ephemeral=True)
+            return
+        await ack(interaction, defer=True, ephemeral=True)
+        side_effects.run(
+            "show_seatmap", self.send_seatmap(interaction, room, page),
+            report_to(interaction, "座位表產生")
+        )
+
+    async def send_seatmap(self, interaction: discord.Interaction, room: Room, page: int):
+        await interaction.followup.send(await seatmap_message(self.bot, room, page), ephemeral=True)
     
     # =========== 查看狀態、剩餘學習時間 ===========
     @app_commands.command(
@@ -308,16 +720,117 @@ class Study(commands.Cog):
         extras={"example": "/check_status"}
     )
     async def check_status(self, interaction: discord.Interaction):
-        sess = sessions.get(interaction.user.id)
+        sess = get_state(interaction.guild_id).sessions.get(interaction.user.id)
         if not sess:
             await interaction.response.send_message("你沒有在自習喔。", ephemeral=True)
             return
-        remain = int((sess["end"] - datetime.now()).total_seconds() // 60)
         await interaction.response.send_message(
-            f"⏳ 項目：**{sess['object']}**，剩餘 {max(0, remain)} 分鐘。",
+            f"⏳ 項目：**{sess.object}**，剩餘 {sess.remaining_minutes()} 分鐘。",
             ephemeral=True
         )
 
+    # =========== 個人統計 ===========
+    @app_commands.command(
+        name="my_stats",
+        description="查看自己的學習統計",
+        extras={"example": "/my_stats"}
+    )
+    async def my_stats(self, interaction: discord.Interaction):
+        summary = stats.get(interaction.guild_id).user_summary(interaction.user.id)
+        if not summary["sessions"]:
+            await interaction.response.send_message("你還沒有任何學習紀錄喔。", ephemeral=True)
+            return
+        subjects = "\n".join(
+            f"　• {obj or '未分類'}：{format_minutes(m)}" for obj, m in summary["subjects"][:5]
+        )
+        await interaction.response.send_message(
+            f"📊 {interaction.user.mention} 的學習統計\n"
+            f"今日：{format_minutes(summary['today'])}\n"
+            f"本週：{format_minutes(summary['week'])}\n"
+            f"總計：{format_minutes(summary['total'])}（{summary['sessions']} 次，排名第 {summary['rank']} 名）\n"
+            f"📚 學習項目：\n{subjects}",
+            ephemeral=True
+        )
+
+    # =========== 排行榜 ===========
+    @app_commands.command(
+        name="leaderboard",
+        description="查看伺服器學習排行榜",
+        extras={"example": "/leaderboard [period]本週"}
+    )
+    @app_commands.describe(period="統計區間（選填，預設總計）")
+    @app_commands.choices(period=[
+        app_commands.Choice(name=name, value=value) for value, name in PERIOD_NAMES.items()
+    ])
+    async def leaderboard(self, interaction: discord.Interaction, period: Optional[str] = None):
+        period = period or "all"
+        top = stats.get(interaction.guild_id).leaderboard(period, 10)
+        if not top:
+            await interaction.response.send_message(f"🏆 {PERIOD_NAMES[period]}還沒有任何學習紀錄。", ephemeral=True)
+            return
+        lines = [f"{i}. <@{uid}> — {format_minutes(m)}" for i, (uid, m) in enumerate(top, 1)]
+        await interaction.response.send_message(
+            f"🏆 {PERIOD_NAMES[period]}學習排行榜\n" + "\n".join(lines),
+            allowed_mentions=discord.AllowedMentions.none()
+        )
+
+    # =========== 匯出紀錄 ===========
+    @app_commands.command(
+        name="export_log",
+        description="匯出學習紀錄（CSV / JSONL）",
+        extras={"example": "/export_log [user]@某人 [since]2026-01-01 [until]2026-01-31 [format]CSV"}
+    )
+    @app_commands.describe(
+        user="只匯出某位成員（選填）",
+        object="只匯出包含此關鍵字的學習項目（選填）",
+        since="起始日期 YYYY-MM-DD（選填）",
+        until="結束日期 YYYY-MM-DD，含當天（選填）",
+        format="檔案格式（選填，預設 CSV）",
+        compress="是否以 gzip 壓縮（選填，預設壓縮）"
+    )
+    @app_commands.choices(format=[
+        app_commands.Choice(name="CSV", value="csv"),
+        app_commands.Choice(name="JSONL", value="jsonl"),
+    ])
+    @app_commands.default_permissions(manage_guild=True)
+    async def export_log(self, interaction: discord.Interaction, user: Optional[discord.Member] = None,
+                         object: Optional[str] = None, since: Optional[str] = None,
+                         until: Optional[str] = None, format: Optional[str] = None,
+                         compress: Optional[bool] = True):
+        try:
+            since_dt = datetime.strptime(since, "%Y-%m-%d") if since else None
+            until_dt = datetime.strptime(until, "%Y-%m-%d") + timedelta(days=1) if until else None
+        except ValueError:
+            await interaction.response.send_message("日期格式錯誤，請使用 YYYY-MM-DD。", ephemeral=True)
+            return
+        fmt = format or "csv"
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        # 先讓寫入佇列落地，才匯出得到剛結束的紀錄
+        await log_store.flush_async(timeout=10)
+        filename = f"learning_log_{interaction.guild_id}.{fmt}" + (".gz" if compress else "")
+        fd, path = tempfile.mkstemp(suffix="-" + filename)
+        os.close(fd)
+        try:
+            count = await asyncio.to_thread(
+                export_records, log_store, path, fmt, compress,
+                since_dt, until_dt, user.id if user else None, interaction.guild_id, object
+            )
+            if not count:
+                await interaction.followup.send("找不到符合條件的學習紀錄。", ephemeral=True)
+                return
+            size = os.path.getsize(path)
+            limit = interaction.guild.filesize_limit if interaction.guild else EXPORT_SIZE_LIMIT
+            if size > limit:
+                await interaction.followup.send(
+                    f"檔案太大（{size / 1024 / 1024:.1f} MB），請縮小日期範圍或開啟壓縮。", ephemeral=True
+                )
+                return
+            await interaction.followup.send(
+                f"📦 共匯出 {count} 筆紀錄。", file=discord.File(path, filename=filename), ephemeral=True
+            )
+        finally:
+            os.remove(path)
+
 # ========= 啟動 =========
 async def setup(bot: commands.Bot):
     await bot.add_cog(Study(bot))
@@ -0,0 +1,360 @@
+# tools/analyze_log.py
+# 學習紀錄離線分析：在 bot 行程外以多核心彙整，輸出文字 / CSV 報表
+#   python -m tools.analyze_log learning_log --month 2026-09
+#   python -m tools.analyze_log learning_log.db --since 2026-01-01 --format csv --out reports/
+import os
+import sys
+import csv
+import gzip
+import json
+import time
+import sqlite3
+import argparse
+from datetime import datetime, timedelta
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+from utils.records import normalize_row
+
+CHUNK_BYTES = 32 * 1024 * 1024   # 單一 JSONL 檔依位元組切塊
+SQLITE_CHUNK = 250_000          # SQLite 依 id 區間切塊
+ARRAY_BATCH = 100_000           # 舊版 JSON 陣列邊讀邊分批送出
+LENGTH_BUCKETS = (15, 30, 45, 60, 90, 120, 180, 240)   # 自習長度分布（分鐘，上界）
+WEEKDAYS = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+# ========= 部分結果 =========
+def empty_partial() -> dict:
+    return {
+        "count": 0, "minutes": 0, "first": None, "last": None,
+        "users": {},       # user_id -> [minutes, sessions, username, 最後出現的 start]
+        "subjects": {},    # object -> [minutes, sessions]
+        "months": {},      # "YYYY-MM" -> minutes
+        "heatmap": [[0] * 24 for _ in range(7)],   # 星期 x 開始小時 -> 分鐘
+        "lengths": [0] * (len(LENGTH_BUCKETS) + 1),
+    }
+
+_HOURS = {}   # epoch 小時 -> (月份, 星期, 小時)；同一小時開始的紀錄不必重算 localtime
+
+def local_hour(ts: int) -> tuple:
+    key = ts // 3600
+    cached = _HOURS.get(key)
+    if cached is None:
+        t = time.localtime(ts)
+        cached = _HOURS[key] = (f"{t.tm_year:04d}-{t.tm_mon:02d}", t.tm_wday, t.tm_hour)
+    return cached
+
+def add_record(p: dict, r: dict, since: Optional[int], until: Optional[int], guild_id: Optional[int]):
+    start = r["start"]
+    if (since is not None and start < since) or (until is not None and start >= until):
+        return
+    if guild_id is not None and r.get("guild_id") != guild_id:
+        return
+    minutes = r["minutes"]
+    p["count"] += 1
+    p["minutes"] += minutes
+    if p["first"] is None or start < p["first"]:
+        p["first"] = start
+    if p["last"] is None or start > p["last"]:
+        p["last"] = start
+
+    u = p["users"].get(r["user_id"])
+    if u is None:
+        u = p["users"][r["user_id"]] = [0, 0, r.get("username"), start]
+    u[0] += minutes
+    u[1] += 1
+    if start >= u[3]:
+        u[2], u[3] = r.get("username"), start
+
+    s = p["subjects"].get(r.get("object") or "")
+    if s is None:
+        s = p["subjects"][r.get("object") or ""] = [0, 0]
+    s[0] += minutes
+    s[1] += 1
+
+    month, wday, hour = local_hour(start)
+    p["months"][month] = p["months"].get(month, 0) + minutes
+    p["heatmap"][wday][hour] += minutes
+    for i, bound in enumerate(LENGTH_BUCKETS):
+        if minutes <= bound:
+            p["lengths"][i] += 1
+            break
+    else:
+        p["lengths"][-1] += 1
+
+def merge(into: dict, p: dict):
+    into["count"] += p["count"]
+    into["minutes"] += p["minutes"]
+    for k, better in (("first", min), ("last", max)):
+        if p[k] is not None:
+            into[k] = p[k] if into[k] is None else better(into[k], p[k])
+    for uid, (m, n, name, seen) in p["users"].items():
+        u = into["users"].get(uid)
+        if u is None:
+            into["users"][uid] = [m, n, name, seen]
+            continue
+        u[0] += m
+        u[1] += n
+        if seen >= u[3]:
+            u[2], u[3] = name, seen
+    for obj, (m, n) in p["subjects"].items():
+        s = into["subjects"].setdefault(obj, [0, 0])
+        s[0] += m
+        s[1] += n
+    for month, m in p["months"].items():
+        into["months"][month] = into["months"].get(month, 0) + m
+    for d in range(7):
+        for h in range(24):
+            into["heatmap"][d][h] += p["heatmap"][d][h]
+    for i, n in enumerate(p["lengths"]):
+        into["lengths"][i] += n
+
+# ========= 工作單位（在子行程執行）=========
+_decode = json.JSONDecoder().decode
+
+def _parse(line: str) -> Optional[dict]:
+    try:
+        return normalize_row(_decode(line))
+    except (ValueError, TypeError):
+        return None   # 空行或寫到一半的尾行
+
+def scan_range(path: str, start: int, end: int, filters: tuple) -> dict:
+    """處理 [start, end) 內開頭的每一行；切點落在行中間時由前一塊負責"""
+    p = empty_partial()
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        if pos >= end:
+            return p
+        # 整塊讀進來再切行，比逐行 readline / tell 快；最後一行不完整時補讀到行尾
+        data = f.read(end - pos)
+        if not data.endswith(b"\n"):
+            data += f.readline()
+    for line in data.decode("utf-8").splitlines():
+        r = _parse(line)
+        if r:
+            add_record(p, r, *filters)
+    return p
+
+def scan_gzip(path: str, filters: tuple) -> dict:
+    p = empty_partial()
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            r = _parse(line)
+            if r:
+                add_record(p, r, *filters)
+    return p
+
+def scan_sqlite(path: str, lo: int, hi: int, filters: tuple) -> dict:
+    p = empty_partial()
+    fields = ("guild_id", "user_id", "username", "object", "start", "end", "minutes")
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = conn.execute(f"SELECT {', '.join(fields)} FROM learning_log WHERE id >= ? AND id < ?", (lo, hi))
+        for row in rows:
+            add_record(p, normalize_row(dict(zip(fields, row))), *filters)
+    finally:
+        conn.close()
+    return p
+
+def scan_batch(records: List[dict], filters: tuple) -> dict:
+    p = empty_partial()
+    for r in records:
+        add_record(p, normalize_row(r), *filters)
+    return p
+
+# ========= 切分輸入 =========
+def file_tasks(path: str, chunk_bytes: int) -> Iterator[tuple]:
+    if path.endswith(".gz"):
+        yield (scan_gzip, path)
+        return
+    size = os.path.getsize(path)
+    for start in range(0, size, chunk_bytes):
+        yield (scan_range, path, start, min(size, start + chunk_bytes))
+
+def sqlite_tasks(path: str, chunk: int) -> Iterator[tuple]:
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        lo, hi = conn.execute("SELECT min(id), max(id) FROM learning_log").fetchone()
+    finally:
+        conn.close()
+    if lo is None:
+        return
+    for start in range(lo, hi + 1, chunk):
+        yield (scan_sqlite, path, start, start + chunk)
+
+def iter_json_array(f, block: int = 1 << 20) -> Iterator[dict]:
+    """逐段讀取 [ {...}, {...} ] 格式，一次只保留一個區塊在記憶體"""
+    decoder = json.JSONDecoder()
+    buf = f.read(block).lstrip()
+    if not buf.startswith("["):
+        raise ValueError("not a JSON array")
+    buf, pos, eof = buf[1:], 0, False
+    while True:
+        while pos < len(buf) and buf[pos] in " \t\r\n,":
+            pos += 1
+        if pos < len(buf) and buf[pos] == "]":
+            return
+        try:
+            obj, end = decoder.raw_decode(buf, pos)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            chunk = f.read(block)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        yield obj
+        pos = end
+
+def is_json_array(path: str) -> bool:
+    with open(path, "r", encoding="utf-8") as f:
+        head = f.read(64).lstrip()
+    return head.startswith("[")
+
+def list_inputs(path: str) -> List[str]:
+    if os.path.isdir(path):
+        # segmented 目錄：每月的 .jsonl 與 .jsonl.gz
+        return sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if name.endswith(".jsonl") or name.endswith(".jsonl.gz")
+        )
+    return [path]
+
+def month_range(month: str) -> Tuple[datetime, datetime]:
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start + timedelta(days=32)).replace(day=1)
+
+# ========= 執行 =========
+def analyze(paths: List[str], filters: tuple, workers: Optional[int] = None,
+            chunk_bytes: int = CHUNK_BYTES) -> dict:
+    total = empty_partial()
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for path in paths:
+            if path.endswith(".db"):
+                futures += [pool.submit(fn, *args, filters) for fn, *args in sqlite_tasks(path, SQLITE_CHUNK)]
+            elif not path.endswith(".gz") and is_json_array(path):
+                futures += submit_array(pool, path, filters, total, workers * 2)
+            else:
+                futures += [pool.submit(fn, *args, filters) for fn, *args in file_tasks(path, chunk_bytes)]
+        for fut in as_completed(futures):
+            merge(total, fut.result())
+    return total
+
+def submit_array(pool, path: str, filters: tuple, total: dict, in_flight: int) -> list:
+    """舊版 JSON 陣列只能循序解析：主行程分批送出，同時在途的批次有上限，記憶體不隨檔案變大"""
+    pending = []
+    with open(path, "r", encoding="utf-8") as f:
+        batch = []
+        for r in iter_json_array(f):
+            batch.append(r)
+            if len(batch) >= ARRAY_BATCH:
+                pending.append(pool.submit(scan_batch, batch, filters))
+                batch = []
+                if len(pending) >= in_flight:
+                    merge(total, pending.pop(0).result())
+        if batch:
+            pending.append(pool.submit(scan_batch, batch, filters))
+    return pending
+
+# ========= 報表 =========
+def fmt_time(ts: Optional[int]) -> str:
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M") if ts is not None else "-"
+
+def length_labels() -> List[str]:
+    labels, lo = [], 0
+    for bound in LENGTH_BUCKETS:
+        labels.append(f"{lo + 1}-{bound}")
+        lo = bound
+    return labels + [f">{LENGTH_BUCKETS[-1]}"]
+
+def render_text(p: dict, top: int) -> str:
+    lines = [
+        f"records: {p['count']}  minutes: {p['minutes']}  ({p['minutes'] / 60:.1f} h)",
+        f"range: {fmt_time(p['first'])} ~ {fmt_time(p['last'])}",
+        "",
+        "== per month ==",
+    ]
+    lines += [f"{m}  {minutes / 60:10.1f} h" for m, minutes in sorted(p["months"].items())]
+
+    lines += ["", f"== top {top} users =="]
+    users = sorted(p["users"].items(), key=lambda kv: -kv[1][0])
+    lines += [
+        f"{i:>3}. {name or uid:<20} {m / 60:8.1f} h  {n:>6} sessions"
+        for i, (uid, (m, n, name, _)) in enumerate(users[:top], 1)
+    ]
+
+    lines += ["", f"== top {top} subjects =="]
+    subjects = sorted(p["subjects"].items(), key=lambda kv: -kv[1][0])
+    lines += [f"{obj or '(none)':<24} {m / 60:8.1f} h  {n:>6} sessions" for obj, (m, n) in subjects[:top]]
+
+    lines += ["", "== start hour heatmap (hours) =="]
+    width = max(4, len(f"{max(max(row) for row in p['heatmap']) / 60:.0f}")) + 1
+    lines.append("     " + "".join(f"{h:>{width}}" for h in range(24)))
+    for d, row in enumerate(p["heatmap"]):
+        lines.append(f"{WEEKDAYS[d]:<5}" + "".join(f"{m / 60:>{width}.0f}" for m in row))
+
+    lines += ["", "== session length (minutes) =="]
+    peak = max(p["lengths"]) or 1
+    for label, n in zip(length_labels(), p["lengths"]):
+        lines.append(f"{label:>8} {n:>8}  {'#' * round(40 * n / peak)}")
+    return "\n".join(lines)
+
+def write_csv(p: dict, out: str):
+    os.makedirs(out, exist_ok=True)
+
+    def dump(name: str, header: list, rows):
+        with open(os.path.join(out, name), "w", encoding="utf-8", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(header)
+            w.writerows(rows)
+
+    dump("users.csv", ["user_id", "username", "minutes", "sessions"],
+         ((uid, name, m, n) for uid, (m, n, name, _) in sorted(p["users"].items(), key=lambda kv: -kv[1][0])))
+    dump("subjects.csv", ["object", "minutes", "sessions"],
+         ((obj, m, n) for obj, (m, n) in sorted(p["subjects"].items(), key=lambda kv: -kv[1][0])))
+    dump("months.csv", ["month", "minutes"], sorted(p["months"].items()))
+    dump("heatmap.csv", ["weekday"] + [str(h) for h in range(24)],
+         ([WEEKDAYS[d]] + row for d, row in enumerate(p["heatmap"])))
+    dump("lengths.csv", ["minutes", "sessions"], zip(length_labels(), p["lengths"]))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="學習紀錄離線分析")
+    parser.add_argument("path", help="segmented 目錄、.jsonl / .jsonl.gz、.db 或舊版 learning_log.json")
+    parser.add_argument("--month", help="只統計某月 YYYY-MM")
+    parser.add_argument("--since", help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--until", help="結束日期 YYYY-MM-DD（含當天）")
+    parser.add_argument("--guild", type=int, help="只統計某個伺服器")
+    parser.add_argument("--workers", type=int, default=None, help="子行程數，預設為 CPU 核心數")
+    parser.add_argument("--chunk-mb", type=int, default=CHUNK_BYTES // (1024 * 1024))
+    parser.add_argument("--format", choices=("text", "csv"), default="text")
+    parser.add_argument("--out", default="reports", help="CSV 輸出目錄")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    since = datetime.strptime(args.since, "%Y-%m-%d") if args.since else None
+    until = datetime.strptime(args.until, "%Y-%m-%d") + timedelta(days=1) if args.until else None
+    if args.month:
+        since, until = month_range(args.month)
+    filters = (
+        int(since.timestamp()) if since else None,
+        int(until.timestamp()) if until else None,
+        args.guild,
+    )
+
+    t0 = time.perf_counter()
+    result = analyze(list_inputs(args.path), filters, args.workers, args.chunk_mb * 1024 * 1024)
+    elapsed = time.perf_counter() - t0
+
+    if args.format == "csv":
+        write_csv(result, args.out)
+        print(f"wrote CSV reports to {args.out}/")
+    else:
+        print(render_text(result, args.top))
+    print(f"\n{result['count']} records in {elapsed:.2f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,59 @@
+# utils/actor.py
+import asyncio
+from typing import Any, Callable
+
+# ========= 單一寫入者 =========
+class GuildActor:
+    """一個伺服器的狀態只由一個 consumer 修改。
+    操作是同步函式 fn(state, *args)，依送出順序逐一執行，呼叫端 await 結果；不需要鎖"""
+
+    def __init__(self, state: Any, max_batch: int = 64):
+        self.state = state
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = None
+        self.processed = 0
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, fn: Callable, *args) -> asyncio.Future:
+        """送出操作，回傳結果的 future；不需要結果時可以不 await"""
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((fn, args, fut))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return fut
+
+    async def call(self, fn: Callable, *args) -> Any:
+        return await self.submit(fn, *args)
+
+    async def _run(self):
+        while True:
+            # 一次取出目前排隊的操作，連續執行完才讓出事件迴圈
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            stop = False
+            for op in batch:
+                if op is None:
+                    stop = True
+                    continue
+                fn, args, fut = op
+                if fut.cancelled():
+                    # 呼叫端已放棄（例如互動逾時），操作視同沒發生
+                    continue
+                try:
+                    fut.set_result(fn(self.state, *args))
+                except Exception as e:
+                    fut.set_exception(e)
+                self.processed += 1
+            if stop:
+                return
+
+    async def close(self):
+        """處理完已排隊的操作後停止 consumer"""
+        if self._task is None or self._task.done():
+            return
+        self._queue.put_nowait(None)
+        await self._task
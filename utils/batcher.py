@@ -0,0 +1,50 @@
+# utils/batcher.py
+import asyncio
+from typing import Any, Awaitable, Callable, List, Optional
+
+# ========= 批次收集 =========
+class Coalescer:
+    """把 window 秒內送進來的項目收集起來，一次交給 handler；累積到 max_items 時立即送出"""
+
+    def __init__(self, window: float = 1.0, max_items: int = 500):
+        self.window = window
+        self.max_items = max_items
+        self._items: List[Any] = []
+        self._timer: Optional[asyncio.Task] = None
+        self._handler: Optional[Callable[[List[Any]], Awaitable]] = None
+        self._pending = set()
+
+    def start(self, handler: Callable[[List[Any]], Awaitable]):
+        self._handler = handler
+
+    def add(self, item: Any):
+        self._items.append(item)
+        if len(self._items) >= self.max_items:
+            self._spawn(self.flush())
+        elif self._timer is None or self._timer.done():
+            self._timer = self._spawn(self._delayed())
+
+    def _spawn(self, coro) -> asyncio.Task:
+        task = asyncio.create_task(coro)
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _delayed(self):
+        await asyncio.sleep(self.window)
+        await self.flush()
+
+    async def flush(self):
+        items, self._items = self._items, []
+        if not items:
+            return
+        try:
+            await self._handler(items)
+        except Exception as e:
+            print(f"batch handler error ({len(items)} items):", e)
+
+    async def close(self):
+        """取消計時並立即處理剩下的項目"""
+        if self._timer and not self._timer.done() and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        await self.flush()
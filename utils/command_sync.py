@@ -0,0 +1,44 @@
+# utils/command_sync.py
+import os
+import json
+import hashlib
+from typing import Optional
+from discord import app_commands
+
+FINGERPRINT_FILE = ".command_tree.json"
+
+# ========= 指令樹指紋 =========
+def tree_fingerprint(tree: app_commands.CommandTree, guild=None) -> str:
+    """指令名稱、說明、參數（to_dict 的內容）加上 extras 的穩定雜湊"""
+    payload = []
+    for cmd in tree.get_commands(guild=guild):
+        data = cmd.to_dict(tree)
+        extras = {}
+        if isinstance(cmd, app_commands.Group):
+            for sub in cmd.walk_commands():
+                extras[sub.qualified_name] = sub.extras
+        else:
+            extras[cmd.qualified_name] = cmd.extras
+        payload.append({"command": data, "extras": extras})
+    payload.sort(key=lambda d: (d["command"].get("type", 1), d["command"]["name"]))
+    raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def load_fingerprint(scope: str, path: str = FINGERPRINT_FILE) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f).get(scope)
+    except (OSError, ValueError):
+        return None
+
+def save_fingerprint(scope: str, digest: str, path: str = FINGERPRINT_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        data = {}
+    data[scope] = digest
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
@@ -0,0 +1,54 @@
+# utils/export.py
+import csv
+import gzip
+import json
+from datetime import datetime
+from typing import Iterable, Iterator, Optional
+from utils.log_store import FIELDS, LogStore
+
+# ========= 匯出 =========
+def filter_object(records: Iterable[dict], object: Optional[str]) -> Iterator[dict]:
+    if not object:
+        yield from records
+        return
+    needle = object.lower()
+    for r in records:
+        if needle in (r.get("object") or "").lower():
+            yield r
+
+def export_row(r: dict) -> dict:
+    # 檔案裡存 epoch，匯出給人看的改回 ISO 時間
+    row = {k: r.get(k) for k in FIELDS}
+    for k in ("start", "end"):
+        if row[k] is not None:
+            row[k] = datetime.fromtimestamp(row[k]).isoformat()
+    return row
+
+def write_csv(records: Iterable[dict], f) -> int:
+    writer = csv.writer(f)
+    writer.writerow(FIELDS)
+    count = 0
+    for r in records:
+        row = export_row(r)
+        writer.writerow([row[k] for k in FIELDS])
+        count += 1
+    return count
+
+def write_jsonl(records: Iterable[dict], f) -> int:
+    count = 0
+    for r in records:
+        f.write(json.dumps(export_row(r), ensure_ascii=False) + "\n")
+        count += 1
+    return count
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl}
+
+def export_records(store: LogStore, path: str, fmt: str = "csv", compress: bool = True,
+                   since: Optional[datetime] = None, until: Optional[datetime] = None,
+                   user_id: Optional[int] = None, guild_id: Optional[int] = None,
+                   object: Optional[str] = None) -> int:
+    """把篩選後的紀錄一筆一筆串流寫進檔案，回傳筆數；整份紀錄不會同時放在記憶體裡"""
+    records = filter_object(store.query(since=since, until=until, user_id=user_id, guild_id=guild_id), object)
+    opener = gzip.open if compress else open
+    with opener(path, "wt", encoding="utf-8", newline="") as f:
+        return WRITERS[fmt](records, f)
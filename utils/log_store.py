@@ -0,0 +1,486 @@
+# utils/log_store.py
+import os
+import gzip
+import json
+import time
+import queue
+import sqlite3
+import asyncio
+import threading
+from datetime import date, datetime
+from typing import Callable, Iterable, Iterator, List, Optional, Union
+from utils.records import LogRecord, normalize_row
+
+FIELDS = ("guild_id", "user_id", "username", "object", "start", "end", "minutes")   # start / end 為 epoch 秒
+_STOP = object()
+
+# ========= 共同介面 =========
+class LogStore:
+    """學習紀錄後端：append 只放進佇列，由背景執行緒批次寫入並 fsync"""
+
+    def __init__(self, path: str, batch_size: int = 512):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue: "queue.Queue" = queue.Queue()
+        self._thread = None
+        self.errors = 0   # 寫入失敗的批次數，flush 以此判斷是否確實落盤
+        self.on_write: Optional[Callable[[int, float], None]] = None   # (筆數, 秒數)，在寫入執行緒中呼叫
+
+    # ---- 子類別實作 ----
+    def _open(self):
+        raise NotImplementedError
+
+    def _write(self, records: list):
+        raise NotImplementedError
+
+    def _close(self):
+        raise NotImplementedError
+
+    def iter_records(self) -> Iterator[dict]:
+        raise NotImplementedError
+
+    def _candidates(self, since: Optional[datetime], until: Optional[datetime], user_id: Optional[int],
+                    guild_id: Optional[int] = None) -> Iterator[dict]:
+        # 預設全掃；有索引的後端只讀相關的部分
+        return self.iter_records()
+
+    def query(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+              user_id: Optional[int] = None, guild_id: Optional[int] = None) -> Iterator[dict]:
+        """依開始時間 [since, until)、使用者與伺服器篩選紀錄"""
+        lo = since.timestamp() if since else None
+        hi = until.timestamp() if until else None
+        for r in self._candidates(since, until, user_id, guild_id):
+            if user_id is not None and r.get("user_id") != user_id:
+                continue
+            if guild_id is not None and r.get("guild_id") != guild_id:
+                continue
+            if (lo is not None and r["start"] < lo) or (hi is not None and r["start"] >= hi):
+                continue
+            yield r
+
+    # ---- 生命週期 ----
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name=f"log-writer:{self.path}", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """送出停止訊號並等待佇列寫完"""
+        if not self._thread:
+            return
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._thread = None
+
+    # ---- 寫入 ----
+    def append(self, record: Union[LogRecord, dict]):
+        self._queue.put(record)
+
+    def append_many(self, records: Iterable[Union[LogRecord, dict]]):
+        for r in records:
+            self._queue.put(r)
+
+    def flush(self, timeout: float = None) -> bool:
+        """阻塞到目前為止排入的紀錄都已落盤；逾時或期間有寫入失敗時回傳 False"""
+        if not self._thread:
+            return True
+        errors = self.errors
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout) and self.errors == errors
+
+    async def flush_async(self, timeout: float = None) -> bool:
+        return await asyncio.to_thread(self.flush, timeout)
+
+    def _run(self):
+        self._open()
+        try:
+            while True:
+                item = self._queue.get()
+                batch, waiters, stop = [], [], False
+                while True:
+                    if item is _STOP:
+                        stop = True
+                    elif isinstance(item, threading.Event):
+                        waiters.append(item)
+                    else:
+                        # 佇列中放 LogRecord（或已是 dict 的舊紀錄），寫入前才轉成 dict
+                        batch.append(item.to_row() if isinstance(item, LogRecord) else item)
+                    if stop or len(batch) >= self.batch_size:
+                        break
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                if batch:
+                    t0 = time.perf_counter()
+                    try:
+                        self._write(batch)
+                    except Exception as e:
+                        self.errors += 1
+                        print("log store write error:", e)
+                    if self.on_write:
+                        self.on_write(len(batch), time.perf_counter() - t0)
+                for w in waiters:
+                    w.set()
+                if stop:
+                    break
+        finally:
+            self._close()
+
+# ========= JSON Lines =========
+class JsonlLogStore(LogStore):
+    """一行一筆 JSON，只追加不重寫"""
+
+    def _open(self):
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _write(self, records: list):
+        self._fh.write(dump_jsonl(records))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def _close(self):
+        self._fh.close()
+
+    def iter_records(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            yield from read_jsonl(f)
+
+def dump_jsonl(records: Iterable[dict]) -> str:
+    # 不留空白，每筆少十幾個位元組
+    return "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+
+def read_jsonl(f) -> Iterator[dict]:
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            # 舊紀錄的 ISO 時間在讀取時轉成 epoch
+            yield normalize_row(json.loads(line))
+        except json.JSONDecodeError:
+            # 寫到一半的尾行，略過
+            continue
+
+# ========= 依月份切段 =========
+class SegmentedLogStore(LogStore):
+    """path 為目錄：每月一段 YYYY-MM.jsonl，超過 archive_after 個月的段壓成 .jsonl.gz；
+    index.json 記錄每段的時間範圍、筆數、使用者與伺服器，查詢只讀相關的段。
+    索引只在換月、壓縮與關閉時存檔，未壓縮的近期段在開啟時重掃，寫入成本不隨歷史成長"""
+
+    INDEX_FILE = "index.json"
+
+    def __init__(self, path: str, batch_size: int = 512, archive_after: int = 3):
+        super().__init__(path, batch_size)
+        self.archive_after = archive_after
+        self.index = {}       # 段名 -> {min, max, count, users(set), guilds(set), archived}
+        self._handles = {}    # 段名 -> 開啟中的檔案（只在寫入執行緒使用）
+        self._index_lock = threading.Lock()
+        self._index_loaded = False
+
+    @staticmethod
+    def segment_key(record: dict) -> str:
+        return time.strftime("%Y-%m", time.localtime(record["start"]))
+
+    def _raw_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.jsonl")
+
+    def _gz_path(self, key: str) -> str:
+        return os.path.join(self.path, f"{key}.jsonl.gz")
+
+    # ---- 索引 ----
+    def _ensure_index(self):
+        with self._index_lock:
+            if self._index_loaded:
+                return
+            os.makedirs(self.path, exist_ok=True)
+            try:
+                with open(os.path.join(self.path, self.INDEX_FILE), "r", encoding="utf-8") as f:
+                    raw = json.load(f)
+                if any(isinstance(v["min"], str) for v in raw.values()):
+                    raise ValueError("index uses ISO timestamps")   # 舊版索引，重建成 epoch
+                self.index = {
+                    k: {**v, "users": set(v["users"]), "guilds": set(v["guilds"])}
+                    for k, v in raw.items()
+                }
+                # 未壓縮的段在上次存檔後可能又寫入（或當機沒存到），重掃這幾段
+                for name in os.listdir(self.path):
+                    if name.endswith(".jsonl"):
+                        self._reindex(name[:-len(".jsonl")])
+            except (OSError, ValueError, KeyError):
+                # 沒有索引或索引損毀：掃一次現有的段重建
+                self.index = {}
+                for name in os.listdir(self.path):
+                    if name.endswith(".jsonl") or name.endswith(".jsonl.gz"):
+                        key = name.split(".", 1)[0]
+                        if key not in self.index:
+                            for r in self._read_segment(key):
+                                self._index_add(key, r)
+                            self.index.setdefault(key, self._empty_entry())["archived"] = not os.path.exists(self._raw_path(key))
+                self._save_index()
+            self._index_loaded = True
+
+    def _reindex(self, key: str):
+        self.index[key] = self._empty_entry()
+        for r in self._read_segment(key):
+            self._index_add(key, r)
+
+    @staticmethod
+    def _empty_entry() -> dict:
+        return {"min": None, "max": None, "count": 0, "users": set(), "guilds": set(), "archived": False}
+
+    def _index_add(self, key: str, record: dict):
+        entry = self.index.get(key)
+        if entry is None:
+            entry = self.index[key] = self._empty_entry()
+        start = record.get("start")
+        if entry["min"] is None or start < entry["min"]:
+            entry["min"] = start
+        if entry["max"] is None or start > entry["max"]:
+            entry["max"] = start
+        entry["count"] += 1
+        entry["users"].add(record.get("user_id"))
+        entry["guilds"].add(record.get("guild_id"))
+
+    def _save_index(self):
+        data = {
+            k: {**v, "users": sorted(u for u in v["users"] if u is not None),
+                "guilds": sorted(g for g in v["guilds"] if g is not None)}
+            for k, v in self.index.items()
+        }
+        path = os.path.join(self.path, self.INDEX_FILE)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+
+    # ---- 寫入 ----
+    def _open(self):
+        self._ensure_index()
+        self._compact_old()
+
+    def _write(self, records: list):
+        groups = {}
+        for r in records:
+            groups.setdefault(self.segment_key(r), []).append(r)
+        rolled = False
+        for key, group in groups.items():
+            fh = self._handles.get(key)
+            if fh is None:
+                rolled = rolled or key not in self.index
+                fh = self._handles[key] = open(self._raw_path(key), "a", encoding="utf-8")
+            fh.write(dump_jsonl(group))
+            fh.flush()
+            os.fsync(fh.fileno())
+            with self._index_lock:
+                for r in group:
+                    self._index_add(key, r)
+                self.index[key]["archived"] = False
+        # 索引只更新記憶體；當月段的項目在下次開啟時會重掃，不必每批重寫 index.json
+        if rolled:
+            # 進入新的月份：存一次索引，順便把過舊的段壓縮
+            with self._index_lock:
+                self._save_index()
+            self._compact_old()
+
+    def _close(self):
+        for fh in self._handles.values():
+            fh.close()
+        self._handles.clear()
+        with self._index_lock:
+            self._save_index()
+
+    def _compact_old(self):
+        today = date.today()
+        month = today.year * 12 + today.month - 1 - self.archive_after
+        cutoff = f"{month // 12:04d}-{month % 12 + 1:02d}"
+        for key in sorted(self.index):
+            if key >= cutoff or not os.path.exists(self._raw_path(key)):
+                continue
+            fh = self._handles.pop(key, None)
+            if fh:
+                fh.close()
+            self._archive(key)
+
+    def _archive(self, key: str):
+        """把段（含已存在的 .gz）合併壓成一個 .jsonl.gz，再刪掉原始檔"""
+        gz_path = self._gz_path(key)
+        tmp = gz_path + ".tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as out:
+            for r in self._read_segment(key):
+                out.write(dump_jsonl((r,)))
+        os.replace(tmp, gz_path)
+        os.remove(self._raw_path(key))
+        with self._index_lock:
+            self.index[key]["archived"] = True
+            self._save_index()
+
+    # ---- 讀取 ----
+    def _read_segment(self, key: str) -> Iterator[dict]:
+        gz_path, raw_path = self._gz_path(key), self._raw_path(key)
+        if os.path.exists(gz_path):
+            with gzip.open(gz_path, "rt", encoding="utf-8") as f:
+                yield from read_jsonl(f)
+        if os.path.exists(raw_path):
+            with open(raw_path, "r", encoding="utf-8") as f:
+                yield from read_jsonl(f)
+
+    def segments(self, since: Optional[datetime] = None, until: Optional[datetime] = None,
+                 user_id: Optional[int] = None, guild_id: Optional[int] = None) -> List[str]:
+        """依索引挑出可能包含符合條件紀錄的段"""
+        self._ensure_index()
+        lo = since.timestamp() if since else None
+        hi = until.timestamp() if until else None
+        with self._index_lock:
+            items = sorted((k, dict(v)) for k, v in self.index.items())
+        keys = []
+        for key, entry in items:
+            if not entry["count"]:
+                continue
+            if lo is not None and entry["max"] < lo:
+                continue
+            if hi is not None and entry["min"] >= hi:
+                continue
+            if user_id is not None and user_id not in entry["users"]:
+                continue
+            if guild_id is not None and guild_id not in entry["guilds"]:
+                continue
+            keys.append(key)
+        return keys
+
+    def _candidates(self, since, until, user_id, guild_id=None) -> Iterator[dict]:
+        for key in self.segments(since, until, user_id, guild_id):
+            yield from self._read_segment(key)
+
+    def iter_records(self) -> Iterator[dict]:
+        return self._candidates(None, None, None)
+
+# ========= SQLite (WAL) =========
+class SqliteLogStore(LogStore):
+    """stdlib sqlite3，WAL 模式，每批一個交易"""
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS learning_log ("
+        "id INTEGER PRIMARY KEY, guild_id INTEGER, user_id INTEGER, username TEXT, object TEXT, "
+        "start INTEGER, end INTEGER, minutes INTEGER)"
+    )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(self.SCHEMA)
+        self._migrate_epoch(conn)
+        return conn
+
+    def _migrate_epoch(self, conn: sqlite3.Connection):
+        """舊表的 start / end 是 ISO 字串（TEXT），整表轉成 epoch 一次"""
+        columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(learning_log)")}
+        if columns.get("start", "").upper() != "TEXT":
+            return
+        cols = ", ".join(FIELDS)
+        with conn:
+            conn.execute("ALTER TABLE learning_log RENAME TO learning_log_iso")
+            conn.execute(self.SCHEMA)
+            rows = conn.execute(f"SELECT {cols} FROM learning_log_iso ORDER BY id")
+            conn.executemany(
+                f"INSERT INTO learning_log ({cols}) VALUES ({', '.join('?' * len(FIELDS))})",
+                (tuple(normalize_row(dict(zip(FIELDS, row)))[k] for k in FIELDS) for row in rows.fetchall()),
+            )
+            conn.execute("DROP TABLE learning_log_iso")
+
+    def _open(self):
+        self._conn = self._connect()
+
+    def _write(self, records: list):
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT INTO learning_log ({', '.join(FIELDS)}) VALUES ({', '.join('?' * len(FIELDS))})",
+                [tuple(r.get(k) for k in FIELDS) for r in records],
+            )
+
+    def _close(self):
+        self._conn.close()
+
+    def iter_records(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        conn = self._connect()
+        try:
+            for row in conn.execute(f"SELECT {', '.join(FIELDS)} FROM learning_log ORDER BY id"):
+                yield dict(zip(FIELDS, row))
+        finally:
+            conn.close()
+
+    def _candidates(self, since, until, user_id, guild_id=None) -> Iterator[dict]:
+        # 條件交給 SQL，Python 端只剩最後的精確比對
+        if not os.path.exists(self.path):
+            return
+        where, args = [], []
+        if since:
+            where.append("start >= ?")
+            args.append(since.timestamp())
+        if until:
+            where.append("start < ?")
+            args.append(until.timestamp())
+        if user_id is not None:
+            where.append("user_id = ?")
+            args.append(user_id)
+        if guild_id is not None:
+            where.append("guild_id = ?")
+            args.append(guild_id)
+        sql = f"SELECT {', '.join(FIELDS)} FROM learning_log"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        conn = self._connect()
+        try:
+            for row in conn.execute(sql + " ORDER BY id", args):
+                yield dict(zip(FIELDS, row))
+        finally:
+            conn.close()
+
+# ========= 建立 / 遷移 =========
+BACKENDS = {
+    "segmented": SegmentedLogStore,
+    "jsonl": JsonlLogStore,
+    "sqlite": SqliteLogStore,
+}
+
+def open_log_store(backend: str, path: str) -> LogStore:
+    try:
+        cls = BACKENDS[backend]
+    except KeyError:
+        raise ValueError(f"unknown log backend: {backend}") from None
+    return cls(path)
+
+def migrate_json_array(json_path: str, store: LogStore, extra: dict = None) -> int:
+    """把舊版 JSON 陣列檔一次性搬進 store，完成後改名為 .migrated；extra 補上舊紀錄缺少的欄位"""
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data = [normalize_row({**extra, **r} if extra else r) for r in data]
+    store.append_many(data)
+    if not store.flush():
+        # 沒有確認寫入就保留原檔，下次啟動再遷移
+        print(f"⚠️ {json_path} 遷移未確認寫入，保留原檔")
+        return 0
+    os.replace(json_path, json_path + ".migrated")
+    return len(data)
+
+def migrate_jsonl(jsonl_path: str, store: LogStore) -> int:
+    """把單一 JSON Lines 檔串流搬進 store（例如從 jsonl 後端換成 segmented），完成後改名為 .migrated"""
+    if not os.path.exists(jsonl_path) or os.path.abspath(jsonl_path) == os.path.abspath(store.path):
+        return 0
+    count = 0
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for r in read_jsonl(f):
+            store.append(r)
+            count += 1
+    if not store.flush():
+        print(f"⚠️ {jsonl_path} 遷移未確認寫入，保留原檔")
+        return 0
+    os.replace(jsonl_path, jsonl_path + ".migrated")
+    return count
@@ -0,0 +1,156 @@
+# utils/metrics.py
+import os
+import time
+import asyncio
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Callable, Dict, Tuple
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# ========= 直方圖 =========
+class Histogram:
+    """固定桶界的延遲直方圖（秒），與 Prometheus histogram 相容"""
+
+    def __init__(self, buckets: Tuple[float, ...] = BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)   # 最後一格是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """以桶上界估計分位數"""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+        return self.max
+
+# ========= 指標集合 =========
+class Metrics:
+    """整個行程共用的指標：延遲直方圖、錯誤次數、量表"""
+
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.errors = defaultdict(int)   # (metric, label) -> 次數
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        self.started = time.time()
+
+    def observe(self, metric: str, seconds: float, label: str = ""):
+        hist = self.histograms.get((metric, label))
+        if hist is None:
+            hist = self.histograms[(metric, label)] = Histogram()
+        hist.observe(seconds)
+
+    def error(self, metric: str, label: str = ""):
+        self.errors[(metric, label)] += 1
+
+    def set_gauge(self, name: str, fn: Callable[[], float]):
+        self.gauges[name] = fn
+
+    def remove_gauge(self, name: str):
+        self.gauges.pop(name, None)
+
+    def wrap_listener(self, coro: Callable, event_name: str) -> Callable:
+        async def wrapped(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return await coro(*args, **kwargs)
+            except Exception:
+                self.error("listener", event_name)
+                raise
+            finally:
+                self.observe("listener", time.perf_counter() - t0, event_name)
+        return wrapped
+
+    # ---- 背景工作 ----
+    async def sample_loop_lag(self, interval: float = 0.5):
+        """每 interval 秒量一次事件迴圈延遲（實際睡眠時間 - 預期）"""
+        loop = asyncio.get_running_loop()
+        while True:
+            t0 = loop.time()
+            await asyncio.sleep(interval)
+            self.observe("event_loop_lag", max(0.0, loop.time() - t0 - interval))
+
+    async def export_loop(self, path: str, interval: float = 15):
+        """定期把 Prometheus 文字格式寫到檔案（給 node_exporter textfile collector）"""
+        while True:
+            await asyncio.sleep(interval)
+            text = self.render_prometheus()
+            try:
+                await asyncio.to_thread(_write_atomic, path, text)
+            except OSError as e:
+                print("metrics export error:", e)
+
+    # ---- 輸出 ----
+    def _gauge_values(self) -> Dict[str, float]:
+        values = {}
+        for name, fn in self.gauges.items():
+            try:
+                values[name] = fn()
+            except Exception:
+                continue
+        return values
+
+    def render_text(self) -> str:
+        lines = [f"{'metric':<34}{'count':>7}{'err':>5}{'p50':>9}{'p99':>9}{'max':>9}"]
+        for (metric, label), h in sorted(self.histograms.items()):
+            name = f"{metric}:{label}" if label else metric
+            lines.append(
+                f"{name[:34]:<34}{h.count:>7}{self.errors.get((metric, label), 0):>5}"
+                f"{_ms(h.quantile(0.5)):>9}{_ms(h.quantile(0.99)):>9}{_ms(h.max):>9}"
+            )
+        for name, value in self._gauge_values().items():
+            lines.append(f"{name:<34}{value:>7}")
+        lines.append(f"{'uptime_seconds':<34}{int(time.time() - self.started):>7}")
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        out = []
+        by_metric = defaultdict(list)
+        for (metric, label), h in self.histograms.items():
+            by_metric[metric].append((label, h))
+        for metric, series in sorted(by_metric.items()):
+            name = f"studymate_{metric}_seconds"
+            out.append(f"# TYPE {name} histogram")
+            for label, h in series:
+                lab = f'name="{label}",' if label else ""
+                cumulative = 0
+                for bound, c in zip(h.buckets, h.counts):
+                    cumulative += c
+                    out.append(f'{name}_bucket{{{lab}le="{bound}"}} {cumulative}')
+                out.append(f'{name}_bucket{{{lab}le="+Inf"}} {h.count}')
+                lab = "{" + lab.rstrip(",") + "}" if lab else ""
+                out.append(f"{name}_sum{lab} {h.sum}")
+                out.append(f"{name}_count{lab} {h.count}")
+        if self.errors:
+            out.append("# TYPE studymate_errors_total counter")
+            for (metric, label), n in sorted(self.errors.items()):
+                out.append(f'studymate_errors_total{{kind="{metric}",name="{label}"}} {n}')
+        for name, value in self._gauge_values().items():
+            out.append(f"# TYPE studymate_{name} gauge")
+            out.append(f"studymate_{name} {value}")
+        return "\n".join(out) + "\n"
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+def _write_atomic(path: str, text: str):
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+metrics = Metrics()
@@ -0,0 +1,185 @@
+# utils/notifier.py
+import random
+import asyncio
+from collections import deque
+from typing import Awaitable, Callable, Dict, Optional
+import discord
+
+# ========= 每位使用者的速率 =========
+class Bucket:
+    """token bucket：每 per 秒補 rate 個，最多累積 burst 個"""
+    __slots__ = ("rate", "per", "burst", "tokens", "stamp")
+
+    def __init__(self, rate: float, per: float, burst: float, now: float):
+        self.rate = rate
+        self.per = per
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def take(self, now: float) -> float:
+        """拿到 token 回傳 0，否則回傳還要等幾秒"""
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate / self.per)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) * self.per / self.rate
+
+# ========= 私訊佇列 =========
+class DMNotifier:
+    """私訊統一排隊送出：每位使用者各自限速、同一人累積的訊息合併成一則、
+    暫時性錯誤退避重試、Forbidden（關閉私訊）記住一段時間不再嘗試。
+    send() 不會阻塞也不會丟例外，呼叫端的紀錄與結算不受私訊成敗影響"""
+
+    def __init__(self, workers: int = 4, rate: float = 1, per: float = 5.0, burst: float = 2,
+                 max_retries: int = 4, base_delay: float = 2.0, forbidden_ttl: float = 6 * 3600,
+                 max_pending: int = 20):
+        self.workers = workers
+        self.rate, self.per, self.burst = rate, per, burst
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.forbidden_ttl = forbidden_ttl
+        self.max_pending = max_pending
+        self._queue: asyncio.Queue = asyncio.Queue()   # 輪到送信的 user_id
+        self._pending: Dict[int, deque] = {}           # user_id -> 待送內容
+        self._queued = set()                           # 已在 _queue 或等待重排的 user_id
+        self._buckets: Dict[int, Bucket] = {}
+        self._attempts: Dict[int, int] = {}            # user_id -> 連續失敗次數
+        self._blocked: Dict[int, float] = {}           # user_id -> 解除封鎖的 loop.time()
+        self._timers = set()
+        self._tasks = []
+        self._resolve: Optional[Callable[[int], Awaitable]] = None
+        self.on_event: Optional[Callable[[str], None]] = None   # 失敗事件："forbidden" / "retry" / "dropped"
+        self.sent = 0
+
+    def start(self, resolve: Callable[[int], Awaitable]):
+        """resolve(user_id) 回傳 discord.User 或 None"""
+        self._resolve = resolve
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def close(self):
+        for t in self._tasks:
+            t.cancel()
+        for h in self._timers:
+            h.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+        self._timers.clear()
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in self._pending.values())
+
+    # ---- 對外 ----
+    def can_dm(self, user_id: int) -> bool:
+        until = self._blocked.get(user_id)
+        if until is None:
+            return True
+        if asyncio.get_running_loop().time() >= until:
+            del self._blocked[user_id]
+            return True
+        return False
+
+    def send(self, user_id: int, content: str) -> bool:
+        """排入私訊；已知無法私訊或累積過多時回傳 False"""
+        if not self.can_dm(user_id):
+            return False
+        q = self._pending.setdefault(user_id, deque())
+        if len(q) >= self.max_pending:
+            self._emit("dropped")
+            return False
+        q.append(content)
+        if user_id not in self._queued:
+            self._queued.add(user_id)
+            self._queue.put_nowait(user_id)
+        return True
+
+    # ---- 內部 ----
+    def _emit(self, kind: str):
+        if self.on_event:
+            self.on_event(kind)
+
+    def _requeue_later(self, user_id: int, delay: float):
+        loop = asyncio.get_running_loop()
+
+        def fire():
+            self._timers.discard(handle)
+            self._queue.put_nowait(user_id)
+        handle = loop.call_later(delay, fire)
+        self._timers.add(handle)
+
+    def _take_batch(self, q: deque, limit: int = 1900) -> list:
+        # 同一人排隊中的訊息合併成一則（不超過訊息長度上限）
+        batch = [q.popleft()]
+        size = len(batch[0])
+        while q and size + len(q[0]) + 1 <= limit:
+            size += len(q[0]) + 1
+            batch.append(q.popleft())
+        return batch
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            user_id = await self._queue.get()
+            q = self._pending.get(user_id)
+            if not q:
+                self._queued.discard(user_id)
+                self._pending.pop(user_id, None)
+                continue
+            now = loop.time()
+            bucket = self._buckets.get(user_id)
+            if bucket is None:
+                bucket = self._buckets[user_id] = Bucket(self.rate, self.per, self.burst, now)
+            wait = bucket.take(now)
+            if wait > 0:
+                # 不佔住 worker，時間到再排回佇列
+                self._requeue_later(user_id, wait)
+                continue
+
+            batch = self._take_batch(q)
+            retry = await self._deliver(user_id, "\n".join(batch))
+            if retry is not None:
+                # 放回最前面，退避後再試
+                q.extendleft(reversed(batch))
+                self._requeue_later(user_id, retry)
+            elif q:
+                self._queue.put_nowait(user_id)
+            else:
+                self._queued.discard(user_id)
+                self._pending.pop(user_id, None)
+
+    async def _deliver(self, user_id: int, content: str) -> Optional[float]:
+        """送出一則；需要重試時回傳延遲秒數，否則回傳 None（成功或放棄）"""
+        try:
+            user = await self._resolve(user_id)
+            if user is None:
+                self._drop(user_id, clear=True)
+                return None
+            await user.send(content)
+        except discord.Forbidden:
+            # 關閉私訊或封鎖了 bot：一段時間內不再嘗試
+            self._blocked[user_id] = asyncio.get_running_loop().time() + self.forbidden_ttl
+            self._drop(user_id, "forbidden", clear=True)
+            return None
+        except (discord.HTTPException, asyncio.TimeoutError, OSError) as e:
+            attempts = self._attempts.get(user_id, 0) + 1
+            status = getattr(e, "status", 0)
+            if attempts > self.max_retries or (400 <= status < 500 and status != 429):
+                self._attempts.pop(user_id, None)
+                self._drop(user_id)
+                return None
+            self._attempts[user_id] = attempts
+            self._emit("retry")
+            retry_after = getattr(e, "retry_after", None)
+            return retry_after or self.base_delay * 2 ** (attempts - 1) * random.uniform(0.8, 1.2)
+        self._attempts.pop(user_id, None)
+        self.sent += 1
+        return None
+
+    def _drop(self, user_id: int, kind: str = "dropped", clear: bool = False):
+        # 目前這則已取出；clear=True 時連同排隊中的一起丟棄
+        q = self._pending.get(user_id)
+        if clear and q:
+            q.clear()
+        self._emit(kind)
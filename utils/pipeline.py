@@ -0,0 +1,44 @@
+# utils/pipeline.py
+import asyncio
+from typing import Awaitable, Callable, Optional
+
+# ========= 背景副作用 =========
+class SideEffects:
+    """互動回覆之後才做的慢動作（寫紀錄、重繪、後續訊息）在背景執行；
+    失敗時呼叫 on_error(label, error) 記錄，並可用 report 回報給使用者"""
+
+    def __init__(self):
+        self._pending = set()
+        self.failures = 0
+        self.on_error: Optional[Callable[[str, Exception], None]] = None
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def run(self, label: str, coro: Awaitable,
+            report: Optional[Callable[[Exception], Awaitable]] = None) -> asyncio.Task:
+        task = asyncio.create_task(self._guard(label, coro, report))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+        return task
+
+    async def _guard(self, label: str, coro: Awaitable, report):
+        try:
+            await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.failures += 1
+            print(f"side effect {label} failed:", e)
+            if self.on_error:
+                self.on_error(label, e)
+            if report:
+                try:
+                    await report(e)
+                except Exception as e2:
+                    print(f"side effect {label} report failed:", e2)
+
+    async def drain(self):
+        """等待所有進行中的副作用完成（卸載時使用）"""
+        while self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
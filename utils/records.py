@@ -0,0 +1,65 @@
+# utils/records.py
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional, Union
+
+# ========= 時間格式 =========
+# 記憶體與檔案一律用 epoch 秒（int），比 datetime / ISO 字串小，也能直接比大小
+def to_epoch(value: Union[int, float, str, datetime]) -> int:
+    if isinstance(value, datetime):
+        return int(value.timestamp())
+    if isinstance(value, str):
+        # 舊紀錄的 ISO 字串
+        return int(datetime.fromisoformat(value).timestamp())
+    return int(value)
+
+def now_epoch() -> int:
+    return int(time.time())
+
+def elapsed_minutes(start: int, end: int) -> int:
+    return max(1, (end - start) // 60)
+
+def normalize_row(row: dict) -> dict:
+    """把舊格式紀錄（ISO 字串時間）就地轉成 epoch；新格式原樣回傳"""
+    if isinstance(row.get("start"), str):
+        row["start"] = to_epoch(row["start"])
+        if row.get("end") is not None:
+            row["end"] = to_epoch(row["end"])
+    return row
+
+# ========= 學習紀錄 =========
+@dataclass(slots=True)
+class LogRecord:
+    guild_id: Optional[int]
+    user_id: int
+    username: str
+    object: Optional[str]
+    start: int
+    end: int
+    minutes: int
+
+    def to_row(self) -> dict:
+        return {
+            "guild_id": self.guild_id, "user_id": self.user_id, "username": self.username,
+            "object": self.object, "start": self.start, "end": self.end, "minutes": self.minutes,
+        }
+
+    @classmethod
+    def from_row(cls, row: dict) -> "LogRecord":
+        return cls(
+            row.get("guild_id"), row["user_id"], row.get("username"), row.get("object"),
+            to_epoch(row["start"]), to_epoch(row["end"]), row["minutes"],
+        )
+
+# ========= 進行中的自習 =========
+@dataclass(slots=True)
+class Session:
+    start: int
+    end: int
+    object: Optional[str]
+    notify_channel_id: int
+    room: Optional[int] = None
+
+    def remaining_minutes(self, now: Optional[int] = None) -> int:
+        return max(0, (self.end - (now or now_epoch())) // 60)
@@ -0,0 +1,91 @@
+# utils/scheduler.py
+import time
+import heapq
+import asyncio
+import itertools
+from datetime import datetime
+from typing import Awaitable, Callable, Hashable, Optional, Union
+
+# ========= 到期排程器 =========
+class ExpiryScheduler:
+    """單一 sleeper + 最小堆積：所有 key 共用一個背景 task，依到期時間觸發 callback"""
+
+    def __init__(self):
+        self._heap = []          # (timestamp, seq, key)
+        self._deadlines = {}     # key -> timestamp（以此為準，堆積中舊項目延遲丟棄）
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._runner: Optional[asyncio.Task] = None
+        self._callback: Optional[Callable[[Hashable], Awaitable]] = None
+        self._pending = set()
+
+    def start(self, callback: Callable[[Hashable], Awaitable]):
+        self._callback = callback
+        if self._runner is None or self._runner.done():
+            self._runner = asyncio.create_task(self._run())
+
+    def stop(self):
+        if self._runner and not self._runner.done():
+            self._runner.cancel()
+        self._runner = None
+
+    def schedule(self, key: Hashable, when: Union[datetime, float]):
+        """新增或改期，O(log n)；when 可為 datetime 或 epoch 秒"""
+        ts = when.timestamp() if isinstance(when, datetime) else float(when)
+        self._deadlines[key] = ts
+        heapq.heappush(self._heap, (ts, next(self._seq), key))
+        if self._heap[0][2] == key:
+            # 新的最早期限，叫醒 sleeper 重新計時
+            self._wakeup.set()
+        self._maybe_compact()
+
+    def cancel(self, key: Hashable):
+        self._deadlines.pop(key, None)
+        self._maybe_compact()
+
+    def deadline(self, key: Hashable) -> Optional[datetime]:
+        ts = self._deadlines.get(key)
+        return datetime.fromtimestamp(ts) if ts is not None else None
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _maybe_compact(self):
+        # 舊項目太多時重建堆積，避免頻繁改期讓堆積無限成長
+        if len(self._heap) > 2 * len(self._deadlines) + 64:
+            self._compact()
+
+    def _compact(self):
+        self._heap = [e for e in self._heap if self._deadlines.get(e[2]) == e[0]]
+        heapq.heapify(self._heap)
+
+    def _pop_stale(self):
+        while self._heap and self._deadlines.get(self._heap[0][2]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._pop_stale()
+            timeout = self._heap[0][0] - time.time() if self._heap else None
+            if timeout is None or timeout > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            _, _, key = heapq.heappop(self._heap)
+            del self._deadlines[key]
+            task = asyncio.create_task(self._fire(key))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _fire(self, key: Hashable):
+        try:
+            await self._callback(key)
+        except Exception as e:
+            print(f"expiry callback error ({key}):", e)
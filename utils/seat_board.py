@@ -0,0 +1,71 @@
+# utils/seat_board.py
+import asyncio
+from typing import Awaitable, Callable, Hashable
+import discord
+
+# ========= 即時座位表 =========
+class SeatBoard:
+    """每個頻道只維護一則座位表訊息：window 秒內的變動合併成一次 edit，同頻道兩次 edit 至少間隔 min_interval 秒"""
+
+    def __init__(self, window: float = 2.0, min_interval: float = 1.5):
+        self.window = window
+        self.min_interval = min_interval
+        self._messages = {}   # key -> discord.Message
+        self._content = {}    # key -> 上次發出的內容
+        self._renders = {}    # key -> 產生最新內容的 coroutine function
+        self._tasks = {}      # key -> 等待中的 flush task
+        self._locks = {}      # channel_id -> asyncio.Lock，同頻道的發送依序進行
+        self._last = {}       # channel_id -> 上次發送的 loop.time()
+
+    def update(self, channel: discord.abc.Messageable, render: Callable[[], Awaitable[str]], key: Hashable = None):
+        """標記看板需要更新；只保留最新的 render，實際發送延到 window 結束。
+        key 預設為頻道 ID，同一頻道要放多張看板時（例如多間教室）可自訂"""
+        key = channel.id if key is None else key
+        self._renders[key] = render
+        task = self._tasks.get(key)
+        if task is None or task.done():
+            self._tasks[key] = asyncio.create_task(self._flush(channel, key))
+
+    async def _flush(self, channel: discord.abc.Messageable, key: Hashable):
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.sleep(self.window)
+            # 從這裡開始的新變動會排下一次 flush
+            self._tasks.pop(key, None)
+            render = self._renders.pop(key, None)
+            if render is None:
+                return
+            content = await render()
+            if content == self._content.get(key):
+                # 內容沒變（例如大教室沒有變動的那幾頁），不佔用發送間隔
+                return
+            # 同頻道的看板共用一把鎖與發送間隔
+            lock = self._locks.setdefault(channel.id, asyncio.Lock())
+            async with lock:
+                wait = self._last.get(channel.id, 0) + self.min_interval - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self._publish(channel, key, content)
+                self._content[key] = content
+                self._last[channel.id] = loop.time()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"seat board error ({key}):", e)
+
+    async def _publish(self, channel: discord.abc.Messageable, key: Hashable, content: str):
+        msg = self._messages.get(key)
+        if msg is not None:
+            try:
+                await msg.edit(content=content)
+                return
+            except discord.NotFound:
+                # 訊息被刪掉了，重新發一則
+                pass
+        self._messages[key] = await channel.send(content)
+
+    def close(self):
+        for task in self._tasks.values():
+            task.cancel()
+        self._tasks.clear()
+        self._renders.clear()
@@ -0,0 +1,125 @@
+# utils/seating.py
+import json
+import heapq
+from typing import List, Optional
+
+# ========= 教室配置 =========
+def row_name(r: int) -> str:
+    # 0 -> A, 25 -> Z, 26 -> AA
+    name = ""
+    r += 1
+    while r:
+        r, rem = divmod(r - 1, 26)
+        name = chr(ord('A') + rem) + name
+    return name
+
+class Layout:
+    """rows x cols 的座位配置；26 位以內沿用 A、B、C… 單字母編號，否則用「排字母 + 座號」如 B12"""
+
+    def __init__(self, rows: int, cols: int, name: Optional[str] = None):
+        if rows <= 0 or cols <= 0:
+            raise ValueError("rows 與 cols 需為正整數")
+        self.rows = rows
+        self.cols = cols
+        self.name = name
+        self.size = rows * cols
+        if self.size <= 26:
+            self.labels: List[str] = [chr(ord('A') + i) for i in range(self.size)]
+        else:
+            self.labels = [f"{row_name(i // cols)}{i % cols + 1}" for i in range(self.size)]
+        self._index = {label: i for i, label in enumerate(self.labels)}
+
+    def label(self, index: int) -> str:
+        return self.labels[index]
+
+    def index(self, label: str) -> Optional[int]:
+        return self._index.get(label)
+
+DEFAULT_LAYOUT = {"rows": 3, "cols": 3}
+
+def load_layouts(path: str) -> dict:
+    """讀取教室配置檔，格式：
+    {"default": {"rows": 3, "cols": 3},
+     "guilds": {"<guild_id>": {"rows": 5, "cols": 8}},
+     "rooms": {"<voice_channel_id>": {"rows": 20, "cols": 25, "name": "大教室"}}}
+    檔案不存在時全部使用 3x3"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def layout_for(config: dict, guild_id: int, room_id: Optional[int]) -> Layout:
+    spec = (
+        config.get("rooms", {}).get(str(room_id))
+        or config.get("guilds", {}).get(str(guild_id))
+        or config.get("default")
+        or DEFAULT_LAYOUT
+    )
+    return Layout(spec["rows"], spec["cols"], spec.get("name"))
+
+# ========= 空位分配 =========
+class SeatAllocator:
+    """最小堆積 free-list：永遠分配編號最小的空位，分配 / 釋放 O(log n)，額滿時 O(1)"""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._free = list(range(size))   # 已是合法的最小堆積
+        self._taken = set()
+
+    def allocate(self) -> Optional[int]:
+        while self._free:
+            i = heapq.heappop(self._free)
+            if i not in self._taken:
+                self._taken.add(i)
+                return i
+        return None
+
+    def take(self, index: int) -> bool:
+        """指定座位（還原用）；堆積裡的舊項目在 allocate 時略過"""
+        if not 0 <= index < self.size or index in self._taken:
+            return False
+        self._taken.add(index)
+        return True
+
+    def release(self, index: int):
+        if index in self._taken:
+            self._taken.remove(index)
+            heapq.heappush(self._free, index)
+
+    def __len__(self) -> int:
+        return len(self._taken)
+
+# ========= 教室 =========
+class Room:
+    """一間教室（一個語音頻道）的座位狀態"""
+
+    def __init__(self, room_id: Optional[int], layout: Layout):
+        self.room_id = room_id
+        self.layout = layout
+        self.allocator = SeatAllocator(layout.size)
+        self.seat_assign = {}    # user_id -> 座位編號
+        self.seat_occupant = {}  # 座位編號 -> user_id（seat_assign 的反向索引）
+        self.version = 0         # 每次入座 / 離座 +1，用來判斷座位表快取是否過期
+        self.cache = {}          # 頁碼 -> (version, text)
+
+    def assign(self, user_id: int, index: Optional[int] = None) -> Optional[int]:
+        """index 為 None 時分配最前面的空位；回傳座位編號，沒有位子時回傳 None"""
+        if index is None:
+            index = self.allocator.allocate()
+        elif not self.allocator.take(index):
+            index = None
+        if index is None:
+            return None
+        self.seat_assign[user_id] = index
+        self.seat_occupant[index] = user_id
+        self.version += 1
+        return index
+
+    def release(self, user_id: int) -> Optional[int]:
+        index = self.seat_assign.pop(user_id, None)
+        if index is not None:
+            self.seat_occupant.pop(index, None)
+            self.allocator.release(index)
+            self.version += 1
+        return index
@@ -0,0 +1,75 @@
+# utils/session_journal.py
+import os
+from typing import Optional
+from utils.log_store import JsonlLogStore, dump_jsonl
+from utils.records import Session
+
+# ========= 自習事件日誌 =========
+class SessionJournal:
+    """進行中自習的事件日誌（start / update / finish），重啟時重播還原狀態"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._store = JsonlLogStore(path)
+
+    def start(self):
+        self._store.start()
+
+    def close(self):
+        self._store.close()
+
+    # ---- 寫入事件 ----
+    @staticmethod
+    def _start_event(guild_id: int, user_id: int, sess: Session, seat: Optional[str]) -> dict:
+        return {
+            "op": "start", "g": guild_id, "u": user_id, "start": sess.start, "end": sess.end,
+            "object": sess.object, "ch": sess.notify_channel_id, "room": sess.room, "seat": seat,
+        }
+
+    def record_start(self, guild_id: int, user_id: int, sess: Session, seat: Optional[str]):
+        self._store.append(self._start_event(guild_id, user_id, sess, seat))
+
+    def record_update(self, guild_id: int, user_id: int, sess: Session):
+        self._store.append({"op": "update", "g": guild_id, "u": user_id, "end": sess.end, "object": sess.object})
+
+    def record_finish(self, guild_id: int, user_id: int, start: Optional[int] = None):
+        # 帶上開始時間，晚寫入的 finish 不會誤結束同一人之後的新自習
+        self._store.append({"op": "finish", "g": guild_id, "u": user_id, "start": start})
+
+    # ---- 還原 ----
+    def replay(self) -> dict:
+        """重播日誌，回傳 (guild_id, user_id) -> (Session, 座位)"""
+        active = {}
+        for ev in self._store.iter_records():
+            key = (ev.get("g"), ev.get("u"))
+            op = ev.get("op")
+            if op == "start":
+                # 舊日誌的時間是浮點數，一併取整
+                active[key] = (Session(
+                    int(ev["start"]), int(ev["end"]), ev.get("object"), ev.get("ch"), ev.get("room")
+                ), ev.get("seat"))
+            elif op == "update" and key in active:
+                sess = active[key][0]
+                sess.end = int(ev["end"])
+                sess.object = ev.get("object")
+            elif op == "finish":
+                if key in active and ev.get("start") in (None, active[key][0].start):
+                    del active[key]
+        return active
+
+    def compact(self, active: dict):
+        """只保留仍在進行的自習，重寫成一筆 start 一行；必須在 start() 之前呼叫"""
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(dump_jsonl(
+                self._start_event(guild_id, user_id, sess, seat) for (guild_id, user_id), (sess, seat) in active.items()
+            ))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def load(self) -> dict:
+        """重播 + 壓縮，回傳仍在進行（含已過期待結算）的自習"""
+        active = self.replay()
+        self.compact(active)
+        return active
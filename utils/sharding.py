@@ -0,0 +1,31 @@
+# utils/sharding.py
+import os
+from typing import List, Optional, Tuple
+
+# ========= 分片設定 =========
+def shard_config() -> Tuple[Optional[List[int]], Optional[int]]:
+    """從 .env 讀取 SHARD_IDS（逗號分隔）與 SHARD_COUNT；都沒設定時交給 AutoShardedBot 自動決定"""
+    ids_env = os.getenv("SHARD_IDS", "").strip()
+    count_env = os.getenv("SHARD_COUNT", "").strip()
+    shard_ids = [int(x) for x in ids_env.split(",") if x.strip()] or None
+    shard_count = int(count_env) if count_env.isdigit() else None
+    if shard_ids and not shard_count:
+        raise ValueError("SHARD_IDS 需要搭配 SHARD_COUNT")
+    return shard_ids, shard_count
+
+def shard_for(guild_id: int, shard_count: int) -> int:
+    # Discord 官方的分片公式
+    return (guild_id >> 22) % shard_count
+
+def owns_guild(guild_id: Optional[int], shard_ids: Optional[List[int]], shard_count: Optional[int]) -> bool:
+    """這個行程是否負責該伺服器；沒有指定分片時代表單一行程負責全部"""
+    if not shard_ids or not shard_count or guild_id is None:
+        return True
+    return shard_for(guild_id, shard_count) in shard_ids
+
+def partition_path(path: str, shard_ids: Optional[List[int]]) -> str:
+    """多行程部署時每個行程寫自己的紀錄分區，例如 learning_log.shard-0-1.jsonl"""
+    if not shard_ids:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}.shard-{'-'.join(str(i) for i in shard_ids)}{ext}"
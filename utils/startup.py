@@ -0,0 +1,137 @@
+# utils/startup.py
+import ast
+import asyncio
+import importlib
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# ========= 啟動計時 =========
+class StartupProfile:
+    """記錄各啟動階段與各擴充的耗時，on_ready 後輸出"""
+    def __init__(self, origin: float = None):
+        self.origin = origin if origin is not None else time.perf_counter()
+        self.phases: List[Tuple[str, float]] = []
+        self.extensions: Dict[str, Tuple[float, bool]] = {}
+
+    @contextmanager
+    def phase(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def mark(self, name: str, since: float):
+        self.phases.append((name, time.perf_counter() - since))
+
+    def extension(self, ext: str, seconds: float, ok: bool):
+        self.extensions[ext] = (seconds, ok)
+
+    def render(self) -> str:
+        lines = [f"startup total {time.perf_counter() - self.origin:8.3f}s"]
+        lines += [f"  {name:<24}{seconds:8.3f}s" for name, seconds in self.phases]
+        if self.extensions:
+            lines.append("extensions")
+            for ext, (seconds, ok) in sorted(self.extensions.items(), key=lambda kv: -kv[1][0]):
+                lines.append(f"  {ext:<24}{seconds:8.3f}s{'' if ok else '  FAILED'}")
+        return "\n".join(lines)
+
+# ========= 擴充相依 =========
+class ExtensionInfo:
+    __slots__ = ("name", "path", "depends", "lazy", "imports")
+
+    def __init__(self, name: str, path: str, depends: Tuple[str, ...], lazy: bool, imports: Tuple[str, ...]):
+        self.name = name
+        self.path = path
+        self.depends = depends
+        self.lazy = lazy
+        self.imports = imports
+
+def _literal(tree: ast.Module, name: str, default):
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(isinstance(t, ast.Name) and t.id == name for t in node.targets):
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return default
+    return default
+
+def inspect_extension(name: str, path: str) -> ExtensionInfo:
+    """不 import 模組，只解析原始碼取得 DEPENDS / LAZY 與頂層 import"""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), path)
+    imports = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            imports += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            imports.append(node.module)
+    return ExtensionInfo(
+        name, path,
+        tuple(_literal(tree, "DEPENDS", ())),
+        bool(_literal(tree, "LAZY", False)),
+        tuple(m for m in imports if not m.startswith("cogs")),
+    )
+
+def discover_extensions(directory: str = "cogs") -> Dict[str, ExtensionInfo]:
+    found = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".py") and not filename.startswith("_"):
+            name = f"{directory}.{filename[:-3]}"
+            found[name] = inspect_extension(name, os.path.join(directory, filename))
+    return found
+
+def load_waves(infos: Dict[str, ExtensionInfo], names: List[str]) -> List[List[str]]:
+    """依 DEPENDS 分層；同一層彼此無相依，可以同時載入"""
+    pending = {n: {d for d in infos[n].depends if d in names} for n in names}
+    waves = []
+    while pending:
+        ready = sorted(n for n, deps in pending.items() if not deps)
+        if not ready:
+            raise RuntimeError(f"cog 相依有循環：{', '.join(sorted(pending))}")
+        waves.append(ready)
+        for n in ready:
+            del pending[n]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return waves
+
+def _import(module: str) -> Optional[str]:
+    try:
+        importlib.import_module(module)
+    except Exception:
+        return module   # 交給 load_extension 回報真正的錯誤
+    return None
+
+async def prewarm_imports(infos: List[ExtensionInfo]):
+    """在執行緒中預先 import 各擴充用到的模組；擴充本身仍由 load_extension 執行"""
+    modules = sorted({m for info in infos for m in info.imports})
+    await asyncio.gather(*(asyncio.to_thread(_import, m) for m in modules))
+
+async def load_extensions(bot, infos: Dict[str, ExtensionInfo], names: List[str],
+                          profile: StartupProfile) -> List[str]:
+    """逐層並行載入擴充，回傳載入成功的名稱；相依的擴充失敗時略過"""
+    loaded, failed = [], set()
+
+    async def load(ext: str):
+        if failed.intersection(infos[ext].depends):
+            failed.add(ext)
+            print(f"⏭️ 略過 {ext}（相依的擴充載入失敗）")
+            return
+        started = time.perf_counter()
+        try:
+            await bot.load_extension(ext)
+        except Exception as e:
+            failed.add(ext)
+            profile.extension(ext, time.perf_counter() - started, False)
+            print(f"❌ 載入 {ext} 失敗: {e}")
+            return
+        profile.extension(ext, time.perf_counter() - started, True)
+        loaded.append(ext)
+        print(f"✅ 已載入 {ext}")
+
+    for wave in load_waves(infos, names):
+        await asyncio.gather(*(load(ext) for ext in wave))
+    return loaded
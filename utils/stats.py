@@ -0,0 +1,121 @@
+# utils/stats.py
+from bisect import bisect_left, insort
+from collections import defaultdict
+from datetime import date
+from typing import Iterable, List, Optional, Tuple
+from utils.records import LogRecord
+
+# ========= 排行 =========
+class Ranking:
+    """依分鐘數排序的排行榜：二分搜尋定位 O(log n)，但 list 刪除 / 插入要搬移元素，
+    更新實際是 O(n)（連續記憶體搬移，數萬人內仍遠快於重新排序）；取前 k 名 O(k)"""
+
+    def __init__(self):
+        self.scores = {}    # user_id -> minutes
+        self._order = []    # (-minutes, user_id)，遞增排序
+
+    def add(self, user_id: int, minutes: int):
+        old = self.scores.get(user_id)
+        if old is not None:
+            del self._order[bisect_left(self._order, (-old, user_id))]
+        new = (old or 0) + minutes
+        self.scores[user_id] = new
+        insort(self._order, (-new, user_id))
+
+    def top(self, k: int) -> List[Tuple[int, int]]:
+        return [(uid, -neg) for neg, uid in self._order[:k]]
+
+    def rank(self, user_id: int) -> Optional[int]:
+        score = self.scores.get(user_id)
+        if score is None:
+            return None
+        return bisect_left(self._order, (-score, user_id)) + 1
+
+    def __len__(self) -> int:
+        return len(self.scores)
+
+# ========= 學習統計 =========
+def week_key(d: date) -> Tuple[int, int]:
+    iso = d.isocalendar()
+    return (iso[0], iso[1])
+
+class StudyStats:
+    """學習時數的累計統計，每筆 save_log 增量更新；啟動時由 GuildStats.rebuild 重建"""
+
+    def __init__(self):
+        self.total = Ranking()
+        # 只保留最新一天 / 一週的排行，換日換週時捨棄舊的，記憶體不隨歷史年數成長
+        self.day: Optional[date] = None
+        self.daily = Ranking()
+        self.week: Optional[Tuple[int, int]] = None
+        self.weekly = Ranking()
+        self.by_subject = defaultdict(lambda: defaultdict(int))   # user_id -> object -> minutes
+        self.session_count = defaultdict(int)                      # user_id -> 次數
+
+    def add(self, record: LogRecord):
+        uid = record.user_id
+        minutes = record.minutes
+        day = date.fromtimestamp(record.start)
+
+        self.total.add(uid, minutes)
+        if self.day is None or day > self.day:
+            self.day, self.daily = day, Ranking()
+        if day == self.day:
+            self.daily.add(uid, minutes)
+        week = week_key(day)
+        if self.week is None or week > self.week:
+            self.week, self.weekly = week, Ranking()
+        if week == self.week:
+            self.weekly.add(uid, minutes)
+        self.by_subject[uid][record.object or ""] += minutes
+        self.session_count[uid] += 1
+
+    def _period(self, period: str, today: date) -> Optional[Ranking]:
+        if period == "today":
+            return self.daily if self.day == today else None
+        if period == "week":
+            return self.weekly if self.week == week_key(today) else None
+        return self.total
+
+    def leaderboard(self, period: str, k: int, today: Optional[date] = None) -> List[Tuple[int, int]]:
+        ranking = self._period(period, today or date.today())
+        return ranking.top(k) if ranking else []
+
+    def user_summary(self, user_id: int, today: Optional[date] = None) -> dict:
+        today = today or date.today()
+        daily = self._period("today", today)
+        weekly = self._period("week", today)
+        subjects = sorted(self.by_subject.get(user_id, {}).items(), key=lambda kv: -kv[1])
+        return {
+            "total": self.total.scores.get(user_id, 0),
+            "today": daily.scores.get(user_id, 0) if daily else 0,
+            "week": weekly.scores.get(user_id, 0) if weekly else 0,
+            "sessions": self.session_count.get(user_id, 0),
+            "rank": self.total.rank(user_id),
+            "subjects": subjects,
+        }
+
+class GuildStats:
+    """依伺服器分開的 StudyStats，紀錄依 guild_id 分流"""
+
+    def __init__(self):
+        self._guilds = {}   # guild_id -> StudyStats
+
+    def get(self, guild_id: Optional[int]) -> StudyStats:
+        stats = self._guilds.get(guild_id)
+        if stats is None:
+            stats = self._guilds[guild_id] = StudyStats()
+        return stats
+
+    def add(self, record: LogRecord):
+        self.get(record.guild_id).add(record)
+
+    def rebuild(self, records: Iterable[dict]) -> int:
+        count = 0
+        for r in records:
+            try:
+                self.add(LogRecord.from_row(r))
+            except (KeyError, TypeError, ValueError):
+                continue
+            count += 1
+        return count
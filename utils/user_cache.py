@@ -0,0 +1,79 @@
+# utils/user_cache.py
+import time
+import asyncio
+from collections import OrderedDict
+from typing import Optional
+import discord
+from discord.ext import commands
+
+# ========= 使用者快取 =========
+class UserCache:
+    """get_user 找不到時才打 fetch_user；結果放進有 TTL 的 LRU，同一個 ID 同時只發一次請求"""
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 600, negative_ttl: float = 60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl   # 查不到的 ID 也暫存，避免重複打 API
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()   # uid -> (expires_at, user)
+        self._inflight = {}   # uid -> Future
+        self.hits = 0
+        self.misses = 0
+
+    async def resolve(self, bot: commands.Bot, user_id: int) -> Optional[discord.User]:
+        user = bot.get_user(user_id)
+        if user:
+            self.hits += 1
+            return user
+
+        entry = self._entries.get(user_id)
+        if entry and entry[0] > time.monotonic():
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+        fut = self._inflight.get(user_id)
+        if fut:
+            self.hits += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[user_id] = fut
+        try:
+            try:
+                user = await bot.fetch_user(user_id)
+            except discord.HTTPException:
+                user = None
+            except Exception as e:
+                # 連線錯誤 / 逾時等也要讓共用的 future 有結果，否則等待中的呼叫端會永遠卡住
+                print(f"fetch_user {user_id} failed:", e)
+                user = None
+            self._put(user_id, user)
+            fut.set_result(user)
+            return user
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        finally:
+            self._inflight.pop(user_id, None)
+
+    def _put(self, user_id: int, user: Optional[discord.User]):
+        ttl = self.ttl if user else self.negative_ttl
+        self._entries[user_id] = (time.monotonic() + ttl, user)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def invalidate(self, user_id: int):
+        self._entries.pop(user_id, None)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "inflight": len(self._inflight),
+        }
@@ -0,0 +1,145 @@
+# utils/voice_bell.py
+import asyncio
+import io
+import shutil
+import subprocess
+from typing import Dict, List, Optional
+import discord
+from discord.oggparse import OggStream
+from utils.batcher import Coalescer
+
+# ========= 預先編碼 =========
+def encode_bell(path: str, seconds: float = 4.0, bitrate: int = 96) -> List[bytes]:
+    """只跑一次 ffmpeg：把音檔轉成 48kHz 立體聲 Opus，拆成 20ms 一個的封包"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise RuntimeError("找不到 ffmpeg")
+    fade = max(0.0, seconds - 0.5)
+    out = subprocess.run(
+        [ffmpeg, "-loglevel", "error", "-i", path, "-t", str(seconds),
+         "-af", f"afade=t=out:st={fade}:d=0.5", "-ac", "2", "-ar", "48000",
+         "-c:a", "libopus", "-b:a", f"{bitrate}k", "-frame_duration", "20", "-f", "opus", "pipe:1"],
+        capture_output=True, check=True,
+    ).stdout
+    # 前兩個封包是 OpusHead / OpusTags 標頭，不是音訊
+    return [p for p in OggStream(io.BytesIO(out)).iter_packets() if not p.startswith((b"OpusHead", b"OpusTags"))]
+
+class CachedOpusAudio(discord.AudioSource):
+    """直接送出快取的 Opus 封包，播放時不再解碼或編碼"""
+    def __init__(self, frames: List[bytes]):
+        self._frames = iter(frames)
+
+    def read(self) -> bytes:
+        return next(self._frames, b"")
+
+    def is_opus(self) -> bool:
+        return True
+
+# ========= 語音連線 =========
+class VoicePool:
+    """每個伺服器只有一條語音連線：同伺服器的頻道共用並依序使用，閒置 idle 秒後斷線"""
+
+    def __init__(self, idle: float = 60.0):
+        self.idle = idle
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._idle: Dict[int, asyncio.TimerHandle] = {}
+
+    def lock(self, guild_id: int) -> asyncio.Lock:
+        return self._locks.setdefault(guild_id, asyncio.Lock())
+
+    async def acquire(self, channel: discord.VoiceChannel) -> discord.VoiceClient:
+        """呼叫端需持有 lock(guild.id)"""
+        handle = self._idle.pop(channel.guild.id, None)
+        if handle:
+            handle.cancel()
+        vc = channel.guild.voice_client
+        if vc and vc.is_connected():
+            if vc.channel.id != channel.id:
+                await vc.move_to(channel)
+            return vc
+        if vc:
+            await vc.disconnect(force=True)
+        return await channel.connect(self_deaf=True)
+
+    def release(self, guild: discord.Guild):
+        loop = asyncio.get_running_loop()
+        self._idle[guild.id] = loop.call_later(self.idle, lambda: loop.create_task(self._disconnect(guild)))
+
+    async def _disconnect(self, guild: discord.Guild):
+        self._idle.pop(guild.id, None)
+        async with self.lock(guild.id):
+            vc = guild.voice_client
+            if vc and not vc.is_playing():
+                await vc.disconnect()
+
+    async def close(self, guilds):
+        for handle in self._idle.values():
+            handle.cancel()
+        self._idle.clear()
+        for guild in guilds:
+            if guild.voice_client:
+                await guild.voice_client.disconnect(force=True)
+
+# ========= 鈴聲 =========
+class VoiceBell:
+    """自習結束時在教室語音頻道響鈴；window 秒內同頻道的多次到期只響一次"""
+
+    def __init__(self, path: str, window: float = 2.0, idle: float = 60.0, seconds: float = 4.0):
+        self.path = path
+        self.seconds = seconds
+        self.frames: Optional[List[bytes]] = None
+        self.pool = VoicePool(idle)
+        self._queue = Coalescer(window=window)
+        self._queue.start(self._ring_batch)
+        self._playing = set()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.frames)
+
+    async def load(self) -> bool:
+        """載入時編碼一次；缺 ffmpeg / PyNaCl 或檔案時停用鈴聲，不影響其他功能"""
+        if not discord.voice_client.has_nacl:
+            print("🔕 未安裝 PyNaCl，語音鈴聲停用")
+            return False
+        try:
+            self.frames = await asyncio.to_thread(encode_bell, self.path, self.seconds)
+        except (OSError, RuntimeError, subprocess.CalledProcessError) as e:
+            print(f"🔕 無法編碼 {self.path}，語音鈴聲停用：{e}")
+            return False
+        print(f"🔔 已快取鈴聲 {self.path}（{len(self.frames)} 個 Opus 封包）")
+        return True
+
+    def ring(self, channel):
+        if self.enabled and isinstance(channel, discord.VoiceChannel):
+            self._queue.add(channel)
+
+    async def _ring_batch(self, channels: list):
+        # 播放要好幾秒，另開 task，不卡住下一批收集
+        for ch in {ch.id: ch for ch in channels}.values():
+            task = asyncio.create_task(self._play(ch))
+            self._playing.add(task)
+            task.add_done_callback(self._playing.discard)
+
+    async def _play(self, channel: discord.VoiceChannel):
+        # 頻道裡沒有真人就不進去
+        if not any(not m.bot for m in channel.members):
+            return
+        async with self.pool.lock(channel.guild.id):
+            try:
+                vc = await self.pool.acquire(channel)
+            except (discord.ClientException, discord.HTTPException, asyncio.TimeoutError) as e:
+                print(f"🔕 無法連線到 {channel}：{e}")
+                return
+            if not vc.is_playing():
+                done = asyncio.Event()
+                loop = asyncio.get_running_loop()
+                vc.play(CachedOpusAudio(self.frames), after=lambda _: loop.call_soon_threadsafe(done.set))
+                await done.wait()
+            self.pool.release(channel.guild)
+
+    async def close(self, guilds):
+        await self._queue.close()
+        for task in list(self._playing):
+            task.cancel()
+        await self.pool.close(guilds)